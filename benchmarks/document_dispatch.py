@@ -0,0 +1,80 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Overhead of the patches of pyls_bess on python documents.
+#
+# Document.source, Document.lines and PythonLanguageServer._hook are
+# timed on a .py document of a language server, first with upstream
+# pyls, then after the patches of pyls_bess are installed.  The .py
+# numbers should not change.  The .bess numbers are printed for
+# comparison.
+#
+# Usage: python3 benchmarks/document_dispatch.py [-n NUMBER]
+
+import argparse
+import io
+import timeit
+
+from pyls.python_ls import PythonLanguageServer
+
+from pyls_bess import plugin
+
+PY_URI = 'file:///tmp/pyls-bess-bench/a.py'
+BESS_URI = 'file:///tmp/pyls-bess-bench/a.bess'
+PY_SOURCE = 'import os\n\nprint(os.getcwd())\n' * 50
+BESS_SOURCE = 'src = Source()\nsrc -> 1:Queue() -> Sink()\n' * 50
+
+def make_server():
+    server = PythonLanguageServer(io.BytesIO(), io.BytesIO())
+    server.m_initialize(processId=None, rootUri='file:///tmp/pyls-bess-bench',
+                        initializationOptions={})
+    return server
+
+def measure(server, uri, number):
+    document = server.workspace.get_document(uri)
+    stmts = {
+        'source': lambda: document.source,
+        'lines': lambda: document.lines,
+        '_hook': lambda: server._hook('pyls_document_did_save', uri),
+    }
+    return {name: min(timeit.repeat(stmt, number=number, repeat=5))
+            / number * 1e6
+            for name, stmt in stmts.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    server = make_server()
+    server.workspace.put_document(PY_URI, PY_SOURCE)
+    upstream = measure(server, PY_URI, args.number)
+
+    plugin.install_patches()
+    server.m_text_document__did_open(textDocument={
+        'uri': BESS_URI, 'text': BESS_SOURCE, 'version': 1})
+    patched = measure(server, PY_URI, args.number)
+    bess = measure(server, BESS_URI, args.number)
+
+    print('%-8s %12s %12s %12s' % ('us/call', '.py upstream', '.py patched',
+                                   '.bess'))
+    for name in upstream:
+        print('%-8s %12.3f %12.3f %12.3f'
+              % (name, upstream[name], patched[name], bess[name]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Import time of the pyls_bess entry points.
+#
+# pyls and its plugins are imported first, because the language server
+# loads them anyway, then the entry points of pyls_bess are imported
+# with `python -X importtime`.  The cumulative times of the top-level
+# imports following the marker are the price of pyls_bess.  The
+# slowest modules imported on behalf of pyls_bess are listed as well.
+#
+# Usage: python3 benchmarks/import_time.py [-n RUNS] [--activate]
+#
+# With --activate the plugin is also activated, as if a .bess document
+# was opened, to show the deferred cost.  The first run only writes the
+# bytecode of the sources and it is not counted.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+MARKER = 'pyls-bess-import-time-marker'
+
+PRELOAD = '''
+import pyls.python_ls, pyls.workspace, pyls.config.config
+import pyls.config.pycodestyle_conf, pyls.plugins.jedi_completion
+import pyls.plugins.pycodestyle_lint, pyls.plugins.pyflakes_lint
+'''
+
+ENTRY_POINTS = '''
+import pyls_bess.plugin, pyls_bess.lint, pyls_bess.dmypy
+'''
+
+ACTIVATE = '''
+from pyls_bess import plugin
+plugin.install_patches()
+from pyls_bess.globals_db import get_globals_db
+get_globals_db()
+from pyls_bess import (caches, index, navigation, outline, profiling, rename,
+                       scheduler, semantic_tokens, sugar, timing)
+'''
+
+def run_once(activate):
+    code = '\n'.join([
+        PRELOAD,
+        'import sys; sys.stderr.write(%r + "\\n")' % MARKER,
+        ENTRY_POINTS,
+        ACTIVATE if activate else '',
+    ])
+    # Compiling the sources is not part of the import time.
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          stderr=subprocess.PIPE, universal_newlines=True,
+                          env=env, check=True)
+    lines = proc.stderr.splitlines()
+    lines = lines[lines.index(MARKER) + 1:]
+    total = 0
+    modules = []
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue
+        modules.append((int(self_us), name.strip()))
+        if not name[1:].startswith(' '):
+            # A top-level import.
+            total += int(cumulative_us)
+    return total, modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('--activate', action='store_true')
+    args = parser.parse_args()
+
+    run_once(args.activate)
+    totals = []
+    self_times = {}
+    for _ in range(args.runs):
+        total, modules = run_once(args.activate)
+        totals.append(total)
+        for self_us, name in modules:
+            self_times.setdefault(name, []).append(self_us)
+    print('pyls_bess import time (us): median %d, min %d, max %d'
+          % (statistics.median(totals), min(totals), max(totals)))
+    slowest = sorted(self_times.items(),
+                     key=lambda item: -statistics.median(item[1]))
+    print('slowest modules (median self time, us):')
+    for name, times in slowest[:15]:
+        print('  %8d %s' % (statistics.median(times), name))
+
+if __name__ == '__main__':
+    main()
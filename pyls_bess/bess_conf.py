@@ -54,9 +54,18 @@ USER_CONFIGS = [pycodestyle.USER_CONFIG] if pycodestyle.USER_CONFIG else []
 PROJECT_CONFIGS = ['pycodestyle.cfg', 'setup.cfg', 'tox.ini', '.bessls']
 
 OPTIONS = [
+    ('cache_budget', 'plugins.bess.cache_budget', int),
     ('source_directory', 'plugins.bess.source_directory', str),
     ('definitions', 'plugins.bess.definitions', list),
     ('references', 'plugins.bess.references', list),
+    ('mypy_cache', 'plugins.bess.mypy_cache', bool),
+    ('dmypy', 'plugins.bess.dmypy', bool),
+    ('index', 'plugins.bess.index', bool),
+    ('index_workers', 'plugins.bess.index_workers', int),
+    ('profile_directory', 'plugins.bess.profile_directory', str),
+    ('timing_log', 'plugins.bess.timing_log', str),
+    ('timing_log_interval', 'plugins.bess.timing_log_interval', int),
+    ('worker', 'plugins.bess.worker', bool),
 ]
 
 
@@ -0,0 +1,2 @@
+# pyls-bess stubs format: 1
+# Based on bess version: v0.4.0-145-gbf17211d
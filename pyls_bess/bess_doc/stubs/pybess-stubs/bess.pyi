@@ -0,0 +1,95 @@
+# pyls-bess stubs format: 1
+# Based on bess version: v0.4.0-145-gbf17211d
+
+from typing import Any, Dict, Optional
+
+class BESS:
+    DEF_PORT: int
+
+    class Error(Exception):
+        code: int
+        errmsg: str
+        info: Dict[str, Any]
+        def __init__(self, code: int, errmsg: str, **kwargs: Any) -> None: ...
+
+    class APIError(Exception): ...
+
+    class RPCError(Exception): ...
+
+    debug: bool
+    def __init__(self) -> None: ...
+    def is_connected(self) -> bool: ...
+    def is_connection_broken(self) -> bool: ...
+    def connect(self, host: str = ..., port: int = ...,
+                grpc_url: Optional[str] = ...) -> None: ...
+    def disconnect(self) -> None: ...
+    def set_debug(self, flag: bool) -> None: ...
+    def kill(self, block: bool = ...) -> None: ...
+    def get_version(self) -> Any: ...
+    def reset_all(self) -> Any: ...
+    def pause_all(self) -> Any: ...
+    def check_constraints(self) -> Any: ...
+    def pause_worker(self, wid: int) -> Any: ...
+    def resume_worker(self, wid: int) -> Any: ...
+    def resume_all(self) -> Any: ...
+    def list_plugins(self) -> Any: ...
+    def import_plugin(self, path: str) -> Any: ...
+    def unload_plugin(self, path: str) -> Any: ...
+    def list_drivers(self) -> Any: ...
+    def get_driver_info(self, name: str) -> Any: ...
+    def reset_ports(self) -> Any: ...
+    def list_ports(self) -> Any: ...
+    def create_port(self, driver: str, name: Optional[str] = ...,
+                    arg: Optional[Dict[str, Any]] = ...) -> Any: ...
+    def destroy_port(self, name: str) -> Any: ...
+    def get_port_stats(self, port: str) -> Any: ...
+    def get_link_status(self, port: str) -> Any: ...
+    def list_mclasses(self) -> Any: ...
+    def list_modules(self) -> Any: ...
+    def get_mclass_info(self, name: str) -> Any: ...
+    def reset_modules(self) -> Any: ...
+    def create_module(self, mclass: str, name: Optional[str] = ...,
+                      arg: Optional[Dict[str, Any]] = ...) -> Any: ...
+    def destroy_module(self, name: str) -> Any: ...
+    def get_module_info(self, name: str) -> Any: ...
+    def connect_modules(self, m1: str, m2: str, ogate: int = ...,
+                        igate: int = ...,
+                        skip_default_hooks: bool = ...) -> Any: ...
+    def disconnect_modules(self, name: str, ogate: int = ...) -> Any: ...
+    def run_module_command(self, name: str, cmd: str, arg_type: str,
+                           arg: Dict[str, Any]) -> Any: ...
+    def list_gatehook_classes(self) -> Any: ...
+    def get_gatehook_class_info(self, name: str) -> Any: ...
+    def list_gatehooks(self) -> Any: ...
+    def configure_gate_hook(self, hook: str, module: str, arg: Any,
+                            enable: Optional[bool] = ...,
+                            direction: str = ..., gate: int = ...) -> Any: ...
+    def track_module(self, m: str, enable: bool, bits: bool,
+                     direction: str = ..., gate: int = ...) -> Any: ...
+    def list_workers(self) -> Any: ...
+    def add_worker(self, wid: int, core: int,
+                   scheduler: str = ...) -> Any: ...
+    def destroy_worker(self, wid: int) -> Any: ...
+    def reset_tcs(self) -> Any: ...
+    def list_tcs(self, wid: int = ...) -> Any: ...
+    def add_tc(self, name: str, policy: str, wid: int = ...,
+               parent: str = ..., resource: Optional[str] = ...,
+               priority: Optional[int] = ..., share: Optional[int] = ...,
+               limit: Optional[Dict[str, int]] = ...,
+               max_burst: Optional[Dict[str, int]] = ...,
+               leaf_module_name: Optional[str] = ...,
+               leaf_module_taskid: Optional[int] = ...) -> Any: ...
+    def update_tc_params(self, name: str, resource: Optional[str] = ...,
+                         limit: Optional[Dict[str, int]] = ...,
+                         max_burst: Optional[Dict[str, int]] = ...,
+                         leaf_module_name: Optional[str] = ...,
+                         leaf_module_taskid: Optional[int] = ...) -> Any: ...
+    def update_tc_parent(self, name: str, parent: str = ...,
+                         priority: Optional[int] = ...,
+                         share: Optional[int] = ...) -> Any: ...
+    def get_tc_stats(self, name: str) -> Any: ...
+    def attach_task(self, module_name: str, parent: str = ...,
+                    wid: int = ..., module_taskid: int = ...,
+                    priority: Optional[int] = ...,
+                    share: Optional[int] = ...) -> Any: ...
+    def dump_mempool(self, socket: int = ...) -> Any: ...
@@ -0,0 +1,24 @@
+# pyls-bess stubs format: 1
+# Based on bess version: v0.4.0-145-gbf17211d
+
+from typing import Any, Dict, Optional, Tuple
+
+from pybess.bess import BESS
+
+class Module:
+    bess: BESS
+    name: str
+    mclass: str
+    ogate: int
+    igate: int
+    def __init__(self, **kwargs: Any) -> None: ...
+    def choose_arg(self, arg_type: Any, kwargs: Dict[str, Any]) -> Any: ...
+    def __mul__(self, ogate: int) -> Tuple[Module, int]: ...
+    def __rmul__(self, igate: int) -> Tuple[int, Module]: ...
+    def __add__(self, next_mod: Any) -> Any: ...
+    def connect(self, next_mod: Module, ogate: int = ..., igate: int = ...,
+                skip_default_hooks: bool = ...) -> Any: ...
+    def disconnect(self, ogate: int = ...) -> Any: ...
+    def attach_task(self, parent: str = ..., wid: int = ...,
+                    module_taskid: int = ..., priority: Optional[int] = ...,
+                    share: Optional[int] = ...) -> Any: ...
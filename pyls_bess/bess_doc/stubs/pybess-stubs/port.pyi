@@ -0,0 +1,17 @@
+# pyls-bess stubs format: 1
+# Based on bess version: v0.4.0-145-gbf17211d
+
+from typing import Any
+
+from pybess.bess import BESS
+
+class Port:
+    bess: BESS
+    name: str
+    driver: str
+    mac_addr: str
+    def __init__(self, **kwargs: Any) -> None: ...
+    def get_port_stats(self) -> Any: ...
+    def get_link_status(self) -> Any: ...
+    def set_conf(self, **kwargs: Any) -> Any: ...
+    def get_conf(self) -> Any: ...
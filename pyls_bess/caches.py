@@ -0,0 +1,248 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Registry of the caches of pyls_bess.
+#
+# Every cache registers a CacheStats object counting its hits, misses
+# and evictions.  LRUCache and the lru_cache() decorator do this
+# themselves, other caches call hit() and miss() and provide their
+# entries with a function.  Byte sizes are approximated by following
+# the containers of the entries, only when a report is requested.
+#
+# Caches of per-document data share a global byte budget: their
+# entries are estimated when inserted, and the least recently used
+# entries of any of them are evicted when the budget is exceeded.
+
+import array
+import collections
+import functools
+import sys
+import threading
+
+registry = {}
+MISSING = object()
+
+# Entries measured for the byte size of a cache, the rest is estimated.
+SIZE_SAMPLE = 1000
+# Default byte budget of the caches sharing it.
+DEFAULT_BUDGET = 256 * 2**20
+
+def approx_size(obj, seen=None):
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool, array.array)):
+        return size
+    if isinstance(obj, dict):
+        return size + sum(approx_size(k, seen) + approx_size(v, seen)
+                          for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(approx_size(item, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        return size + approx_size(vars(obj), seen)
+    return size
+
+class CacheStats:
+
+    def __init__(self, name, entries=None):
+        self.name = name
+        self.hits = self.misses = self.evictions = 0
+        self.entries = entries
+        registry[name] = self
+
+    def hit(self):
+        self.hits += 1
+
+    def miss(self):
+        self.misses += 1
+
+    def get_entries(self):
+        "Return [(key, value)] of the entries."
+        return list(self.entries()) if self.entries else []
+
+    def size(self, entries):
+        seen = set()
+        sample = entries[:SIZE_SAMPLE]
+        nbytes = sum(approx_size(e, seen) for e in sample)
+        if sample:
+            nbytes = nbytes * len(entries) // len(sample)
+        return nbytes
+
+    def report(self):
+        entries = self.get_entries()
+        nbytes = self.size(entries)
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'bytes': nbytes,
+        }
+
+class ByteBudget:
+    '''
+    The LRU order of the entries of the caches sharing a byte budget.
+
+    If the total size exceeds the limit, the least recently used entries
+    are evicted, whichever cache they are in.
+    '''
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.total = 0
+        self.order = collections.OrderedDict()
+
+    def add(self, cache, key, nbytes):
+        self.remove(cache, key)
+        self.order[(cache, key)] = nbytes
+        self.total += nbytes
+        cache.nbytes += nbytes
+        self.shrink()
+
+    def touch(self, cache, key):
+        self.order.move_to_end((cache, key))
+
+    def remove(self, cache, key):
+        nbytes = self.order.pop((cache, key), 0)
+        self.total -= nbytes
+        cache.nbytes -= nbytes
+
+    def shrink(self):
+        # The last entry is kept even if it is larger than the limit.
+        while self.total > self.limit and len(self.order) > 1:
+            (cache, key), nbytes = self.order.popitem(last=False)
+            self.total -= nbytes
+            cache.nbytes -= nbytes
+            del cache.data[key]
+            cache.evictions += 1
+
+    def set_limit(self, limit):
+        with lock:
+            self.limit = limit
+            self.shrink()
+
+    def report(self):
+        return {'limit': self.limit, 'bytes': self.total,
+                'entries': len(self.order)}
+
+# Caches are used from the indexing threads as well.  A single lock is
+# shared by all of them, because an insertion can evict the entries of
+# any cache.
+lock = threading.RLock()
+budget = ByteBudget(DEFAULT_BUDGET)
+
+class LRUCache(CacheStats):
+    '''
+    A dict with LRU eviction.
+
+    If `sizeof(key, value)` is given, the entries are counted against
+    the shared byte budget, otherwise only `maxsize` limits the number
+    of entries.
+    '''
+
+    def __init__(self, name, maxsize=None, sizeof=None):
+        super().__init__(name)
+        self.maxsize = maxsize
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self.data = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None, valid=None):
+        '''
+        Return the value of `key` or `default`.
+
+        A value is ignored if `valid(value)` is false.
+        '''
+        with lock:
+            value = self.data.get(key, MISSING)
+            if value is MISSING or (valid and not valid(value)):
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            if self.sizeof:
+                budget.touch(self, key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            if self.sizeof:
+                budget.add(self, key, self.sizeof(key, value))
+            while self.maxsize is not None and len(self.data) > self.maxsize:
+                self.pop(next(iter(self.data)))
+                self.evictions += 1
+
+    def pop(self, key):
+        "Release the entry of `key`."
+        with lock:
+            if self.sizeof:
+                budget.remove(self, key)
+            return self.data.pop(key, None)
+
+    def clear(self):
+        with lock:
+            for key in list(self.data):
+                self.pop(key)
+
+    def get_entries(self):
+        with lock:
+            return list(self.data.items())
+
+    def size(self, entries):
+        if self.sizeof:
+            return self.nbytes
+        return super().size(entries)
+
+def lru_cache(name, maxsize=None, sizeof=None):
+    '''
+    Like functools.lru_cache, but the cache is registered as `name`.
+
+    The cache is available as the `cache` attribute of the function.
+    '''
+    def decorator(func):
+        cache = LRUCache(name, maxsize, sizeof)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = args + tuple(sorted(kwargs.items())) if kwargs else args
+            value = cache.get(key, MISSING)
+            if value is MISSING:
+                value = func(*args, **kwargs)
+                cache.put(key, value)
+            return value
+
+        wrapper.cache = cache
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+def report():
+    "Return {cache name: statistics} and the state of the byte budget."
+    result = {name: stats.report() for name, stats in sorted(registry.items())}
+    with lock:
+        result['budget'] = budget.report()
+    return result
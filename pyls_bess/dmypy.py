@@ -0,0 +1,145 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Type checking of .bess files with a mypy daemon.
+#
+# Enabled by the `bess.dmypy` configuration variable.  Each workspace
+# gets its own dmypy daemon and a shadow directory (on tmpfs, if
+# possible), where the desugared sources of the .bess documents are
+# written.  The daemon only re-checks what has changed since the
+# previous run, and keeps the global variables loaded.
+#
+# This module is loaded by every pyls, so the modules needed only for
+# the daemons are imported when the first daemon is started.
+
+import logging
+import os
+import re
+
+from pyls import hookimpl, lsp
+
+log = logging.getLogger(__name__)
+
+DMYPY_ARGS = ['--show-column-numbers', '--follow-imports', 'normal',
+              '--namespace-packages']
+LINE_PATTERN = r'(.+):(\d+):(\d+): (error|warning|note): (.*)'
+
+daemons = {}
+
+class Daemon:
+
+    def __init__(self, root_path):
+        import hashlib
+        import tempfile
+
+        self.root_path = root_path
+        base = '/dev/shm' if os.access('/dev/shm', os.W_OK) else None
+        key = hashlib.sha1(root_path.encode('utf-8')).hexdigest()[:12]
+        self.shadow_dir = tempfile.mkdtemp(prefix='pyls-bess-%s-' % key,
+                                           dir=base)
+        self.status_file = os.path.join(self.shadow_dir, '.dmypy.json')
+        self.files = {}
+
+    def shadow_path(self, document):
+        path = self.files.get(document.uri)
+        if not path:
+            name = os.path.relpath(document.path, self.root_path)
+            name = re.sub(r'\W', '_', name[:-len('.bess')]) + '.py'
+            path = os.path.join(self.shadow_dir, name)
+            self.files[document.uri] = path
+        return path
+
+    def dmypy(self, *args):
+        # pyls_bess itself is found on MYPYPATH, so it does not have to
+        # be an installed PEP 561 package.
+        import subprocess
+        import sys
+        from .globals_db import get_mpath
+        env = dict(os.environ)
+        env['MYPYPATH'] = os.path.dirname(os.path.dirname(get_mpath()))
+        cmd = [sys.executable, '-m', 'mypy.dmypy',
+               '--status-file', self.status_file] + list(args)
+        proc = subprocess.run(cmd, cwd=self.shadow_dir, env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True)
+        if proc.returncode > 1:
+            log.warning('dmypy failed: %s', proc.stderr or proc.stdout)
+        return proc.stdout
+
+    def check(self, document):
+        path = self.shadow_path(document)
+        with open(path, 'w') as f:
+            f.write(document.source)
+        files = sorted(p for p in self.files.values() if os.path.exists(p))
+        return self.dmypy('run', '--', *(DMYPY_ARGS + files))
+
+    def stop(self):
+        import shutil
+        self.dmypy('stop')
+        shutil.rmtree(self.shadow_dir, ignore_errors=True)
+
+def get_daemon(workspace):
+    daemon = daemons.get(workspace.root_path)
+    if not daemon:
+        if not daemons:
+            import atexit
+            atexit.register(stop_daemons)
+        daemon = Daemon(workspace.root_path)
+        daemons[workspace.root_path] = daemon
+    return daemon
+
+def stop_daemons():
+    for daemon in daemons.values():
+        daemon.stop()
+    daemons.clear()
+
+def parse_output(output, shadow_path):
+    # Line numbers are kept as they are in the desugared source.
+    # pyls_bess.plugin.pyls_lint adjusts them with fix_offset().
+    diagnostics = []
+    for line in output.splitlines():
+        match = re.match(LINE_PATTERN, line)
+        if not match:
+            continue
+        path, row, col, severity, msg = match.groups()
+        # mypy may print paths relative to the shadow directory.
+        path = os.path.join(os.path.dirname(shadow_path), path)
+        if os.path.normpath(path) != shadow_path or severity == 'note':
+            continue
+        row, col = int(row) - 1, max(int(col) - 1, 0)
+        diagnostics.append({
+            'source': 'mypy',
+            'range': {
+                'start': {'line': row, 'character': col},
+                'end': {'line': row, 'character': col + 1},
+            },
+            'message': msg,
+            'severity': (lsp.DiagnosticSeverity.Error if severity == 'error'
+                         else lsp.DiagnosticSeverity.Warning),
+        })
+    return diagnostics
+
+@hookimpl
+def pyls_lint(config, workspace, document):
+    if not document.uri.endswith('.bess'):
+        return []
+    settings = config.plugin_settings('bess', document_path=document.path)
+    if not settings.get('dmypy'):
+        return []
+    daemon = get_daemon(workspace)
+    output = daemon.check(document)
+    return parse_output(output, daemon.shadow_path(document))
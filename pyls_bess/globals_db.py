@@ -0,0 +1,258 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Access to the database generated by bess-gen-doc.
+#
+# globals.min.json.gz contains the locations of module classes,
+# commands and proto messages.  Argument fields, their types and the
+# documentation are only present in globals.py, so they are extracted
+# from there when first needed, and the DB is extended with them:
+#
+#  db['fields'][msg_name] = {field_name: type_str}
+#  db['docs'][mclass_name] and db['docs'][mclass_name + '.' + cmd] =
+#     {'summary': str, 'params': {name: doc}, 'return': type_str}
+
+import ast
+import logging
+import os
+import re
+
+from .caches import CacheStats, lru_cache
+
+log = logging.getLogger(__name__)
+
+def get_mpath(filename=None):
+    p = os.path
+    path = p.realpath(p.join(p.dirname(__file__), 'bess_doc'))
+    if filename:
+        return p.join(path, filename)
+    return path
+
+db = {}
+db_stats = CacheStats('globals_db.db', lambda: db.items())
+def get_globals_db():
+    global db
+    if not db:
+        import gzip
+        import json
+        db_stats.miss()
+        with gzip.open(get_mpath('globals.min.json.gz')) as f:
+            db = json.load(f)
+        msg_full = {m['fullName']: m for m in db['msg']}
+        msg_short = {m['name']: m for m in db['msg']}
+        db['msg'] = msg_short
+        db['msg_full'] = msg_full
+        db['mclass'] = {m['name']: m for m in db['globals']}
+    else:
+        db_stats.hit()
+    return db
+
+def get_mclass(name):
+    return get_globals_db()['mclass'].get(name)
+
+def get_cmd(mclass_name, cmd_name):
+    mclass = get_mclass(mclass_name)
+    if not mclass:
+        return None
+    for cmd in mclass['cmds']:
+        if cmd['cmd'] == cmd_name:
+            return cmd
+    return None
+
+###########################################################################
+
+def annotation_str(node):
+    if node is None:
+        return ''
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return annotation_str(node.value) + '.' + node.attr
+    if isinstance(node, ast.Subscript):
+        s = node.slice
+        if isinstance(s, getattr(ast, 'Index', ())):  # python < 3.9
+            s = s.value
+        return '%s[%s]' % (annotation_str(node.value), annotation_str(s))
+    if isinstance(node, ast.Tuple):
+        return ', '.join(annotation_str(e) for e in node.elts)
+    return '...'
+
+def parse_docstring(doc):
+    summary, params, ret = [], {}, []
+    current = summary
+    for line in (doc or '').splitlines():
+        match = re.match(r'\s*:param (\w+):\s*(.*)', line)
+        if match:
+            current = [match.group(2)]
+            params[match.group(1)] = current
+            continue
+        match = re.match(r'\s*:return:\s*(.*)', line)
+        if match:
+            current = ret
+            current.append(match.group(1))
+            continue
+        current.append(line.strip())
+    join = lambda lines: '\n'.join(lines).strip()
+    return join(summary), {k: join(v) for k, v in params.items()}
+
+def extend_db_from_globals_py():
+    db = get_globals_db()
+    if 'fields' in db:
+        return db
+    fields = {}
+    docs = {}
+    by_line = {m['line']: m for m in db['globals']}
+    with open(get_mpath('globals.py')) as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        mclass = by_line.get(node.lineno)
+        if not mclass:
+            # A TypedDict of a proto message.
+            fields[node.name] = {
+                n.target.id: annotation_str(n.annotation)
+                for n in node.body if isinstance(n, ast.AnnAssign)}
+            continue
+        summary, _ = parse_docstring(ast.get_docstring(node))
+        docs[mclass['name']] = {'summary': summary, 'params': {}}
+        cmd_lines = {c['line']: c for c in mclass['cmds']}
+        for fun in node.body:
+            if not isinstance(fun, ast.FunctionDef):
+                continue
+            if fun.name == '__init__':
+                cmd, key = mclass, mclass['name']
+            elif fun.lineno in cmd_lines:
+                cmd = cmd_lines[fun.lineno]
+                key = mclass['name'] + '.' + cmd['cmd']
+            else:
+                continue
+            summary, params = parse_docstring(ast.get_docstring(fun))
+            args = {a.arg: annotation_str(a.annotation)
+                    for a in fun.args.args[1:]}
+            args.pop('name', None)
+            fields.setdefault(cmd['arg'], args)
+            docs.setdefault(key, {'summary': summary})
+            docs[key]['params'] = params
+            docs[key]['return'] = annotation_str(fun.returns)
+    db['fields'] = fields
+    db['docs'] = docs
+    return db
+
+def get_msg_fields(msg_name):
+    return extend_db_from_globals_py()['fields'].get(msg_name, {})
+
+def get_return_fields(cmd):
+    full_name = cmd.get('return') or ''
+    return get_msg_fields(full_name.split('.')[-1])
+
+###########################################################################
+
+def get_params(mclass_name, cmd_name=None):
+    "Return [(name, type, doc)] of a constructor or a command."
+    if cmd_name:
+        cmd = get_cmd(mclass_name, cmd_name)
+        key = mclass_name + '.' + cmd_name
+    else:
+        cmd = get_mclass(mclass_name)
+        key = mclass_name
+    if not cmd:
+        return None
+    docs = extend_db_from_globals_py()['docs'].get(key, {})
+    params = [(name, type_, docs.get('params', {}).get(name, ''))
+              for name, type_ in get_msg_fields(cmd['arg']).items()]
+    if not cmd_name:
+        params.append(('name', 'str', 'The name of the module instance.'))
+    return params
+
+@lru_cache('globals_db.signature_label')
+def get_signature_label(mclass_name, cmd_name=None):
+    params = get_params(mclass_name, cmd_name)
+    if params is None:
+        return None
+    args = ', '.join('%s: %s = ...' % (name, type_)
+                     for name, type_, _ in params)
+    name = mclass_name + ('.' + cmd_name if cmd_name else '')
+    ret = ''
+    if cmd_name:
+        key = mclass_name + '.' + cmd_name
+        ret = extend_db_from_globals_py()['docs'].get(key, {}).get('return')
+        ret = ' -> ' + ret if ret else ''
+    return '%s(%s)%s' % (name, args, ret)
+
+@lru_cache('globals_db.markdown')
+def get_markdown(mclass_name, cmd_name=None):
+    label = get_signature_label(mclass_name, cmd_name)
+    if label is None:
+        return None
+    db = extend_db_from_globals_py()
+    key = mclass_name + ('.' + cmd_name if cmd_name else '')
+    doc = db['docs'].get(key, {})
+    lines = ['```python', label, '```', '']
+    if cmd_name:
+        lines += ['Command of `%s`.' % mclass_name, '']
+    else:
+        lines += ['BESS %s `%s`.' % (get_mclass(mclass_name)['type'],
+                                     mclass_name), '']
+        summary = db['docs'].get(mclass_name, {}).get('summary')
+        if summary:
+            lines += [summary, '']
+    if cmd_name and doc.get('summary'):
+        lines += [doc['summary'], '']
+    params = get_params(mclass_name, cmd_name)
+    if params:
+        lines += ['Arguments:', '']
+        for name, type_, pdoc in params:
+            pdoc = ' '.join(pdoc.split())
+            lines.append('* `%s: %s`%s' % (name, type_,
+                                           ' -- ' + pdoc if pdoc else ''))
+    return '\n'.join(lines).strip()
+
+@lru_cache('globals_db.allowed_fields')
+def get_allowed_fields(mclass_name, cmd_name=None):
+    "Return the keyword arguments of a constructor or a command."
+    params = get_params(mclass_name, cmd_name)
+    return frozenset(p[0] for p in params or [])
+
+@lru_cache('globals_db.globals_names')
+def get_globals_names():
+    "Return the names defined by globals.py."
+    with open(get_mpath('globals.py')) as f:
+        tree = ast.parse(f.read())
+    names = set()
+    for node in tree.body:
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef)):
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((a.asname or a.name).split('.')[0]
+                         for a in node.names)
+        elif isinstance(node, ast.Assign):
+            names.update(t.id for t in node.targets
+                         if isinstance(t, ast.Name))
+    return frozenset(names)
+
+@lru_cache('globals_db.gate_count')
+def get_gate_count(mclass_name, direction):
+    '''
+    Return the number of 'Input' or 'Output' gates of a module class.
+
+    Return None if the number is unknown or unbounded ("many").
+    '''
+    summary = extend_db_from_globals_py()['docs'].get(mclass_name, {})
+    match = re.search(r'__%s Gates__: *(\d+)' % direction,
+                      summary.get('summary', ''))
+    return int(match.group(1)) if match else None
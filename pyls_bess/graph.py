@@ -0,0 +1,171 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Pipeline graph of a .bess document.
+#
+# Nodes are module instances (identified by their names) or anonymous
+# constructor expressions (identified by their positions).  Edges are
+# the connections of the arrows.  Edge attributes are stored in
+# parallel arrays, and the adjacency lists are stored in CSR format:
+# the outgoing edges of node `n` are
+#   out_edges[out_start[n]:out_start[n + 1]]
+#
+# The graph is built from the Connection objects of sugar.desugar(),
+# which are cached per statement, so it does not parse anything.
+# Rows are the rows of the desugared source.
+
+import re
+from array import array
+
+# Gate values of non-literal gate expressions, e.g. 'rr:j -> q'.
+GATE_EXPR = -1
+
+NODE_RE = re.compile(r'(?:(\w+)\s*=(?!=)\s*)?(.*)$', re.S)
+CALL_RE = re.compile(r'(\w+)\s*\(')
+NAME_RE = re.compile(r'\w+$')
+
+def parse_node(text):
+    "Return (key, name, mclass_name) of the module text of an arrow."
+    match = NODE_RE.match(text)
+    name, expr = match.group(1), match.group(2).strip()
+    call = CALL_RE.match(expr)
+    mclass = call.group(1) if call else ''
+    if name:
+        return name, name, mclass
+    if NAME_RE.match(expr):
+        return expr, expr, ''
+    if call:
+        # Anonymous module, its key is set by the caller.
+        return None, expr, mclass
+    return expr, expr, ''
+
+def parse_gate(text):
+    if text is None:
+        return 0
+    try:
+        return int(text, 0)
+    except ValueError:
+        return GATE_EXPR
+
+class PipelineGraph:
+
+    def __init__(self, connections, declarations=None):
+        self.keys = {}
+        self.node_keys = []
+        self.names = []
+        self.classes = []
+        self.positions = []
+        self.src = array('i')
+        self.dst = array('i')
+        self.ogate = array('i')
+        self.igate = array('i')
+        self.connections = connections
+        self.gate_exprs = {}
+        self.by_row = None
+        for i, c in enumerate(connections):
+            self.src.append(self.add_node(c.src, c.src_pos))
+            self.dst.append(self.add_node(c.dst, c.dst_pos))
+            self.ogate.append(parse_gate(c.ogate))
+            self.igate.append(parse_gate(c.igate))
+            if self.ogate[-1] == GATE_EXPR:
+                self.gate_exprs[(i, 'ogate')] = c.ogate
+            if self.igate[-1] == GATE_EXPR:
+                self.gate_exprs[(i, 'igate')] = c.igate
+        # Instances declared as 'q::Queue()' apart from the arrows.
+        for name, mclass in (declarations or {}).items():
+            node = self.keys.get(name)
+            if node is not None and not self.classes[node]:
+                self.classes[node] = mclass
+        self.out_start, self.out_edges = self.make_csr(self.src)
+        self.in_start, self.in_edges = self.make_csr(self.dst)
+
+    def add_node(self, text, pos):
+        key, name, mclass = parse_node(text)
+        if key is None:
+            # The same anonymous module can be on both sides of
+            # arrows: 'a -> Queue() -> b'.
+            key = '%s@%d:%d' % (mclass, pos[0], pos[1])
+        node = self.keys.get(key)
+        if node is None:
+            node = len(self.names)
+            self.keys[key] = node
+            self.node_keys.append(key)
+            self.names.append(name)
+            self.classes.append(mclass)
+            self.positions.append(pos)
+        elif mclass and not self.classes[node]:
+            self.classes[node] = mclass
+        return node
+
+    def make_csr(self, ends):
+        start = array('i', [0] * (len(self.names) + 1))
+        for node in ends:
+            start[node + 1] += 1
+        for i in range(len(self.names)):
+            start[i + 1] += start[i]
+        fill = array('i', start)
+        edges = array('i', [0] * len(ends))
+        for edge, node in enumerate(ends):
+            edges[fill[node]] = edge
+            fill[node] += 1
+        return start, edges
+
+    def __len__(self):
+        return len(self.names)
+
+    def node(self, name):
+        return self.keys.get(name)
+
+    def out_edges_of(self, node):
+        return self.out_edges[self.out_start[node]:self.out_start[node + 1]]
+
+    def in_edges_of(self, node):
+        return self.in_edges[self.in_start[node]:self.in_start[node + 1]]
+
+    def node_at(self, row, col):
+        "Return the node whose text covers (row, col), or None."
+        if self.by_row is None:
+            self.by_row = {}
+            for edge, c in enumerate(self.connections):
+                for node, text, pos in ((self.src[edge], c.src, c.src_pos),
+                                        (self.dst[edge], c.dst, c.dst_pos)):
+                    if '\n' not in text:
+                        self.by_row.setdefault(pos[0], []).append(
+                            (pos[1], pos[1] + len(text), node))
+        for start, end, node in self.by_row.get(row, ()):
+            if start <= col <= end:
+                return node
+        return None
+
+    def components(self):
+        "Return the list of nodes of each weakly connected component."
+        parent = list(range(len(self.names)))
+
+        def find(n):
+            while parent[n] != n:
+                parent[n] = parent[parent[n]]
+                n = parent[n]
+            return n
+
+        for s, d in zip(self.src, self.dst):
+            s, d = find(s), find(d)
+            if s != d:
+                parent[max(s, d)] = min(s, d)
+        groups = {}
+        for n in range(len(self.names)):
+            groups.setdefault(find(n), []).append(n)
+        return list(groups.values())
@@ -0,0 +1,420 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Index of the .bess files of a workspace.
+#
+# Each file is desugared and its module instances, traffic classes
+# and workers are recorded as symbols:
+#
+#   [kind, name, row, col, is_definition]
+#
+# where kind is 'module', 'tc', 'worker' or 'name' (a usage of a
+# variable that can refer to a module instance).  Usages of module
+# classes and their commands are recorded with kind 'mclass' and 'cmd'
+# and names like 'Queue' and 'Queue.set_size'.  Rows and columns are
+# positions in the original .bess source.
+#
+# The index is saved to XDG_CACHE_HOME/pyls-bess/index.  A file is
+# indexed again only if its mtime or size has changed and its content
+# hash is different.
+
+import ast
+import builtins
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from .caches import CacheStats
+from .globals_db import (get_cmd, get_globals_db, get_globals_names,
+                         get_mclass)
+from .sugar import desugar
+from .trigram import TrigramIndex
+
+log = logging.getLogger(__name__)
+
+INDEX_VERSION = 3
+SKIPPED_DIRS = ('.git', '.hg', '.svn', 'node_modules', '__pycache__')
+# Symbols listed by workspace symbol queries.
+DEFINITION_KINDS = ('module', 'tc', 'worker')
+# Number of files sent to a worker process at once.
+CHUNK_SIZE = 32
+# Number of paths found by the walk of scan_steps() in a step.
+WALK_STEP = 100
+
+def get_str(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, getattr(ast, 'Str', ())):  # python < 3.8
+        return node.s
+    return None
+
+def get_num(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, int):
+        return node.value
+    if isinstance(node, getattr(ast, 'Num', ())):  # python < 3.8
+        return node.n
+    return None
+
+def index_source(src):
+    "Return the symbols of a .bess source."
+    desugared = desugar(src)
+    return index_tree(desugared.tree, src.splitlines())
+
+def index_tree(tree, lines):
+    "Return the symbols of the desugared tree of a source with `lines`."
+    if tree is None:
+        return []
+    ignored = set(dir(builtins)) | get_globals_names()
+    symbols = []
+
+    def add(kind, name, node, is_def, offset=0, col_offset=None):
+        # Row 0 of the desugared source is the import line.
+        row = node.lineno - 2
+        line = lines[row] if 0 <= row < len(lines) else ''
+        if col_offset is None:
+            col_offset = node.col_offset
+        col = line.encode('utf-8')[:col_offset].decode('utf-8', 'ignore')
+        symbols.append([kind, name, row, len(col) + offset, is_def])
+
+    def add_str(kind, node, is_def):
+        name = get_str(node)
+        if name is not None:
+            add(kind, name, node, is_def, offset=1)
+
+    def add_wid(node, is_def):
+        wid = get_num(node)
+        if wid is not None:
+            add('worker', str(wid), node, is_def)
+
+    # Definitions of instances come first, so the tree is walked once
+    # and the usages are added from the collected nodes.
+    instances = {}
+    usages = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id not in ignored and isinstance(node.ctx, ast.Load):
+                usages.append(node)
+        elif isinstance(node, ast.Call):
+            usages.append(node)
+        elif (isinstance(node, ast.Assign)
+              and isinstance(node.value, ast.Call)
+              and isinstance(node.value.func, ast.Name)
+              and get_mclass(node.value.func.id)):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    instances.setdefault(target.id, node.value.func.id)
+                    add('module', target.id, target, True)
+
+    for node in usages:
+        if isinstance(node, ast.Name):
+            add('name', node.id, node, False)
+        elif isinstance(node.func, ast.Name):
+            if get_mclass(node.func.id):
+                add('mclass', node.func.id, node, False)
+        elif isinstance(node.func, ast.Attribute):
+            method = node.func.attr
+            receiver = node.func.value
+            if isinstance(receiver, ast.Name):
+                mclass = instances.get(receiver.id)
+            elif (isinstance(receiver, ast.Call)
+                  and isinstance(receiver.func, ast.Name)):
+                mclass = receiver.func.id
+            else:
+                mclass = None
+            if mclass and get_cmd(mclass, method):
+                # The position of the method name, if available.
+                end = getattr(node.func, 'end_col_offset', None)
+                col_offset = end - len(method) if end else None
+                add('cmd', mclass + '.' + method, node.func, False,
+                    col_offset=col_offset)
+            keywords = {k.arg: k.value for k in node.keywords}
+            first = keywords.get('name', node.args[0] if node.args else None)
+            if method == 'add_tc':
+                add_str('tc', first, True)
+            elif method == 'update_tc_params':
+                add_str('tc', first, False)
+            elif method == 'add_worker':
+                add_wid(keywords.get('wid', node.args[0] if node.args
+                                     else None), True)
+            if method in ('add_tc', 'attach_task', 'update_tc_params'):
+                add_str('tc', keywords.get('parent'), False)
+                add_str('tc', keywords.get('tc'), False)
+                add_wid(keywords.get('wid'), False)
+    symbols.sort(key=lambda s: (s[2], s[3]))
+    return symbols
+
+def get_symbols(desugared):
+    "Return the index symbols of `desugared`, cached on the object."
+    symbols = getattr(desugared, 'symbols', None)
+    if symbols is None:
+        symbols = index_tree(desugared.tree, desugared.raw.splitlines())
+        desugared.symbols = symbols
+    return symbols
+
+def make_entry(path, old_hash=None, src=None):
+    '''
+    Return the index entry of `path`.
+
+    Return False if the file cannot be read.  If the content hash is
+    `old_hash`, the entry has no 'symbols'.
+    '''
+    try:
+        stat = os.stat(path)
+        if src is None:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                src = f.read()
+    except OSError:
+        return False
+    digest = hashlib.sha1(src.encode('utf-8')).hexdigest()
+    entry = {'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': digest}
+    if digest != old_hash:
+        entry['symbols'] = index_source(src)
+    return entry
+
+def index_files(paths_and_hashes):
+    "Run in a worker process.  Return [(path, entry)]."
+    return [(path, make_entry(path, old_hash))
+            for path, old_hash in paths_and_hashes]
+
+def get_index_path(root_path):
+    xdg = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    key = hashlib.sha1(root_path.encode('utf-8')).hexdigest()
+    return os.path.join(xdg, 'pyls-bess', 'index', key + '.json')
+
+def find_bess_files(root_path):
+    for dirpath, dirnames, filenames in os.walk(root_path):
+        dirnames[:] = [d for d in dirnames
+                       if d not in SKIPPED_DIRS and not d.startswith('.')]
+        for filename in filenames:
+            if filename.endswith('.bess'):
+                yield os.path.join(dirpath, filename)
+
+class WorkspaceIndex:
+
+    def __init__(self, root_path):
+        self.root_path = root_path
+        self.path = get_index_path(root_path)
+        self.files = {}
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self.executor = None
+        # The Worker of worker.py, if the scans run there.
+        self.worker = None
+        self.by_name = None
+        self.search_index = None
+        self.stats = CacheStats('index ' + root_path,
+                                lambda: list(self.files.items()))
+        self.load()
+
+    def version(self):
+        return [INDEX_VERSION, get_globals_db()['bess-version']]
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == self.version():
+            self.files = data.get('files', {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.lock:
+            data = {'version': self.version(), 'files': dict(self.files)}
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, self.path)
+
+    def is_stale(self, path, stat):
+        entry = self.files.get(path)
+        return not (entry and entry['mtime'] == stat.st_mtime
+                    and entry['size'] == stat.st_size)
+
+    def merge(self, path, entry):
+        "Store the result of make_entry().  Return True on changes."
+        with self.lock:
+            if entry is False:
+                self.by_name = self.search_index = None
+                return self.files.pop(path, None) is not None
+            if 'symbols' not in entry:
+                # Same content, only the mtime has changed.
+                self.files[path].update(entry)
+                return False
+            self.files[path] = entry
+            self.by_name = self.search_index = None
+            return True
+
+    def update_file(self, path, src=None):
+        "Index `path`.  Return True if the symbols have changed."
+        entry = self.files.get(path)
+        return self.merge(path, make_entry(path, entry and entry['hash'], src))
+
+    def scan(self, workers=None):
+        '''
+        Update the index of every .bess file in the workspace.
+
+        Stale files are indexed in the worker process if there is one,
+        otherwise in `workers` processes, or in this process if
+        `workers` is 0 or 1.  Use cancel() to stop, e.g. when the
+        workspace is closed.
+        '''
+        for _ in self.scan_steps(workers):
+            pass
+
+    def scan_steps(self, workers=None):
+        "Return the steps of scan() for the scheduler."
+        paths = set()
+        for path in find_bess_files(self.root_path):
+            paths.add(path)
+            if len(paths) % WALK_STEP == 0:
+                if self.cancelled.is_set():
+                    return
+                yield
+        with self.lock:
+            for path in set(self.files) - paths:
+                del self.files[path]
+                self.by_name = self.search_index = None
+        stale = []
+        for path in sorted(paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if self.is_stale(path, stat):
+                entry = self.files.get(path)
+                stale.append((path, entry and entry['hash']))
+        yield
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if self.worker and stale:
+            yield from self.scan_worker(stale)
+        elif workers > 1 and len(stale) > CHUNK_SIZE:
+            yield from self.scan_parallel(stale, workers)
+        else:
+            for path, old_hash in stale:
+                if self.cancelled.is_set():
+                    break
+                self.merge(path, make_entry(path, old_hash))
+                yield
+        if not self.cancelled.is_set():
+            self.save()
+
+    def scan_parallel(self, stale, workers):
+        import multiprocessing
+
+        chunks = [stale[i:i + CHUNK_SIZE]
+                  for i in range(0, len(stale), CHUNK_SIZE)]
+        # Forking a threaded server is not safe, see worker.py.
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(
+                workers, mp_context=context) as executor:
+            self.executor = executor
+            futures = [executor.submit(index_files, c) for c in chunks]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    if self.cancelled.is_set():
+                        break
+                    for path, entry in future.result():
+                        self.merge(path, entry)
+                    yield
+            except concurrent.futures.CancelledError:
+                pass
+            finally:
+                self.executor = None
+                for future in futures:
+                    future.cancel()
+
+    def scan_worker(self, stale):
+        from .worker import WorkerError
+
+        chunks = [stale[i:i + CHUNK_SIZE]
+                  for i in range(0, len(stale), CHUNK_SIZE)]
+        futures = {self.worker.submit('index_files', c): c for c in chunks}
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                if self.cancelled.is_set():
+                    break
+                try:
+                    result = future.result()
+                except (WorkerError, concurrent.futures.CancelledError) as e:
+                    log.debug('index in the worker failed: %r', e)
+                    result = index_files(futures[future])
+                for path, entry in result:
+                    self.merge(path, entry)
+                yield
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def cancel(self):
+        "Stop a running or queued scan() as soon as possible, for good."
+        self.cancelled.set()
+        executor = self.executor
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_by_name(self):
+        "Return {name: [(path, kind, row, col, is_def)]} of all symbols."
+        with self.lock:
+            by_name = self.by_name
+            if by_name is not None:
+                self.stats.hit()
+            else:
+                self.stats.miss()
+                by_name = {}
+                for path, entry in self.files.items():
+                    for kind, name, row, col, is_def in entry['symbols']:
+                        by_name.setdefault(name, []).append(
+                            (path, kind, row, col, is_def))
+                self.by_name = by_name
+        return by_name
+
+    def find(self, name, kinds=None, definitions_only=False):
+        "Return [(path, kind, row, col, is_def)] of the symbol `name`."
+        return [s for s in self.get_by_name().get(name, [])
+                if not (kinds and s[1] not in kinds)
+                and not (definitions_only and not s[4])]
+
+    def get_search_index(self):
+        "Return ({display_name: [(name,) + symbol]}, TrigramIndex)."
+        search_index = self.search_index
+        if search_index is not None:
+            return search_index
+        definitions = {}
+        for name, symbols in self.get_by_name().items():
+            for symbol in symbols:
+                kind, is_def = symbol[1], symbol[4]
+                if kind in DEFINITION_KINDS and is_def:
+                    display_name = 'worker ' + name if kind == 'worker' else name
+                    definitions.setdefault(display_name, []).append(
+                        (name,) + symbol)
+        search_index = (definitions, TrigramIndex(definitions))
+        self.search_index = search_index
+        return search_index
+
+    def search(self, query, limit=100):
+        "Return [(display_name, name, path, kind, row, col, is_def)]."
+        definitions, trigrams = self.get_search_index()
+        result = []
+        for name in trigrams.search(query, limit):
+            result.extend((name,) + s for s in definitions[name])
+        return result[:limit]
@@ -0,0 +1,264 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Bess-specific diagnostics computed from the globals DB.
+#
+# Keyword arguments of module constructors and commands are checked
+# against the fields of their proto messages, keys of the returned
+# messages are checked in subscripts, and calls of unknown module
+# classes are reported.  (pyflakes cannot report undefined names,
+# because of the star import of the globals.)  Everything is done in a
+# single walk over the cached syntax tree of the desugared source.
+#
+# The structure of the pipelines is checked on the graph of the
+# arrows.  The results are cached per connected component, so after an
+# edit only the changed components are checked again.
+#
+# The globals DB and the caches are imported by the checks, so that
+# loading this plugin is cheap in projects without .bess files.
+
+import ast
+import builtins
+import difflib
+
+from pyls import hookimpl, lsp
+
+from .plugin import get_desugared, get_instance_classes
+
+SOURCE = 'bess'
+
+def make_diag(document, node, length, message, severity):
+    # Line numbers are kept as they are in the desugared source.
+    # pyls_bess.plugin.pyls_lint adjusts them with fix_offset().
+    row = node.lineno - 1
+    # col_offset counts utf-8 bytes.
+    line = document.lines[row] if row < len(document.lines) else ''
+    col = line.encode('utf-8')[:node.col_offset].decode('utf-8', 'ignore')
+    col = len(col)
+    return {
+        'source': SOURCE,
+        'range': {
+            'start': {'line': row, 'character': col},
+            'end': {'line': row, 'character': col + length},
+        },
+        'message': message,
+        'severity': severity,
+    }
+
+def suggest(word, candidates):
+    match = difflib.get_close_matches(word, candidates, n=1)
+    return " (did you mean '%s'?)" % match[0] if match else ''
+
+def get_defined_names(tree):
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((a.asname or a.name).split('.')[0]
+                         for a in node.names)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+    return names
+
+def get_call_target(node, instances):
+    "Return (mclass_name, cmd_name) of a call node, or None."
+    from .globals_db import get_cmd, get_globals_db
+    func = node.func
+    if isinstance(func, ast.Name):
+        if func.id in get_globals_db()['mclass']:
+            return (func.id, None)
+        return None
+    if not isinstance(func, ast.Attribute):
+        return None
+    receiver = func.value
+    if isinstance(receiver, ast.Name):
+        mclass = instances.get(receiver.id)
+    elif (isinstance(receiver, ast.Call)
+          and isinstance(receiver.func, ast.Name)):
+        mclass = receiver.func.id
+    else:
+        return None
+    if mclass and get_cmd(mclass, func.attr):
+        return (mclass, func.attr)
+    return None
+
+def get_str(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, getattr(ast, 'Str', ())):  # python < 3.8
+        return node.s
+    return None
+
+def check(document):
+    from .globals_db import (get_allowed_fields, get_cmd, get_globals_db,
+                             get_globals_names, get_return_fields)
+    tree = document.bess_ast
+    if tree is None:
+        return []
+    instances = get_instance_classes(document)
+    mclasses = get_globals_db()['mclass']
+    known = set(dir(builtins)) | get_globals_names() | get_defined_names(tree)
+    diagnostics = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Call):
+            target = get_call_target(node.value, instances)
+            key_node = node.slice
+            if isinstance(key_node, getattr(ast, 'Index', ())):  # python < 3.9
+                key_node = key_node.value
+            key = get_str(key_node)
+            if not (target and target[1] and key is not None):
+                continue
+            fields = get_return_fields(get_cmd(*target))
+            if fields and key not in fields:
+                msg = "'%s.%s()' returns no key '%s'%s" % (
+                    target + (key, suggest(key, fields)))
+                diagnostics.append(make_diag(document, key_node, len(key) + 2,
+                                             msg, lsp.DiagnosticSeverity.Error))
+            continue
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        if (isinstance(func, ast.Name) and func.id not in known
+                and func.id[:1].isupper()):
+            msg = "Unknown module class '%s'%s" % (
+                func.id, suggest(func.id, mclasses))
+            diagnostics.append(make_diag(document, func, len(func.id), msg,
+                                         lsp.DiagnosticSeverity.Error))
+            continue
+        target = get_call_target(node, instances)
+        if not target:
+            continue
+        allowed = get_allowed_fields(*target)
+        for keyword in node.keywords:
+            if keyword.arg is None or keyword.arg in allowed:
+                continue
+            name = '.'.join(t for t in target if t)
+            msg = "'%s' has no argument '%s'%s" % (
+                name, keyword.arg, suggest(keyword.arg, allowed))
+            diagnostics.append(make_diag(
+                document, keyword if hasattr(keyword, 'lineno') else node,
+                len(keyword.arg), msg, lsp.DiagnosticSeverity.Error))
+    return diagnostics
+
+def get_attached(tree):
+    "Return the names of modules with an 'x.attach_task()' call."
+    attached = set()
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr == 'attach_task'
+            and isinstance(node.func.value, ast.Name)):
+            attached.add(node.func.value.id)
+    return attached
+
+# component signature -> [(edge or node index, is_edge, message, severity)]
+COMPONENT_CACHE_SIZE = 10000
+component_cache = None
+def get_component_cache():
+    global component_cache
+    if component_cache is None:
+        from .caches import LRUCache, approx_size
+        component_cache = LRUCache(
+            'lint.components', COMPONENT_CACHE_SIZE,
+            lambda key, value: approx_size((key, value)))
+    return component_cache
+
+def check_component(graph, nodes, classes, attached):
+    from .globals_db import get_gate_count, get_mclass
+    from .graph import GATE_EXPR
+    component_cache = get_component_cache()
+    # Indices in the results are local to the component, so the
+    # cached results remain valid if the component moves in the file.
+    local = {n: i for i, n in enumerate(nodes)}
+    edges = [e for n in nodes for e in graph.out_edges_of(n)]
+    signature = (
+        tuple((graph.names[n], classes[n], graph.names[n] in attached)
+              for n in nodes),
+        tuple((local[graph.src[e]], graph.ogate[e],
+               local[graph.dst[e]], graph.igate[e]) for e in edges))
+    results = component_cache.get(signature)
+    if results is not None:
+        return results, edges
+
+    results = []
+    for i, n in enumerate(nodes):
+        name, mclass = graph.names[n], classes[n]
+        out_edges = graph.out_edges_of(n)
+        used = {}
+        for e in out_edges:
+            ogate = graph.ogate[e]
+            if ogate == GATE_EXPR:
+                continue
+            if ogate in used:
+                msg = "Output gate %d of '%s' is already connected" % (
+                    ogate, name)
+                results.append((edges.index(e), True, msg,
+                                lsp.DiagnosticSeverity.Error))
+            used[ogate] = e
+        if not mclass or not get_mclass(mclass):
+            # Unknown classes are reported by check().
+            continue
+        if not out_edges and graph.in_edges_of(n):
+            if get_gate_count(mclass, 'Output') != 0:
+                msg = "Output of '%s' is never connected" % name
+                results.append((i, False, msg,
+                                lsp.DiagnosticSeverity.Warning))
+        if mclass == 'Queue' and name not in attached:
+            msg = "Queue '%s' is never attached to a task" % name
+            results.append((i, False, msg, lsp.DiagnosticSeverity.Warning))
+
+    component_cache.put(signature, results)
+    return results, edges
+
+def check_pipelines(document):
+    tree = document.bess_ast
+    if tree is None:
+        return []
+    graph = get_desugared(document).graph
+    instances = get_instance_classes(document)
+    classes = [graph.classes[n] or instances.get(graph.names[n], '')
+               for n in range(len(graph))]
+    attached = get_attached(tree)
+    diagnostics = []
+    for nodes in graph.components():
+        results, edges = check_component(graph, nodes, classes, attached)
+        for index, is_edge, msg, severity in results:
+            if is_edge:
+                c = graph.connections[edges[index]]
+                pos, length = c.ogate_pos or c.pos, len(c.ogate or '->') + 1
+            else:
+                n = nodes[index]
+                pos, length = graph.positions[n], len(graph.names[n])
+            diagnostics.append({
+                'source': SOURCE,
+                'range': {
+                    'start': {'line': pos[0], 'character': pos[1]},
+                    'end': {'line': pos[0], 'character': pos[1] + length},
+                },
+                'message': msg,
+                'severity': severity,
+            })
+    return diagnostics
+
+@hookimpl
+def pyls_lint(document):
+    if not document.uri.endswith('.bess'):
+        return []
+    return check(document) + check_pipelines(document)
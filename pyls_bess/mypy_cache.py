@@ -0,0 +1,171 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Prebuilt mypy cache for pyls_bess.bess_doc.globals.
+#
+# Build it with:
+#
+#   python3 -m pyls_bess.mypy_cache
+#
+# This generates globals.pyi next to globals.py, and type checks it
+# into a cache directory that belongs to the installed mypy version.
+# When pyls-bess is activated in a workspace, this cache is copied to
+# a cache directory of the workspace.  The type checks of .bess
+# documents use the copy (see use_cache_dir()), so only the user's
+# buffer is analyzed on the first type check.  Other type checks keep
+# their own cache, so python files and other projects are not mixed
+# up with the .bess files.
+
+import contextlib
+import hashlib
+import logging
+import os
+import sys
+import threading
+
+from .globals_db import get_mpath
+
+log = logging.getLogger(__name__)
+
+MODULE = 'pyls_bess.bess_doc.globals'
+
+# Should be the same as the arguments of pyls-mypy, otherwise mypy
+# considers the cache stale.
+MYPY_ARGS = ['--incremental', '--show-column-numbers',
+             '--follow-imports', 'silent']
+# Number of files copied in a step of seed_steps().
+COPY_STEP = 50
+
+# The cache directory of the type checks of the current thread.
+local = threading.local()
+
+def get_mypy_version():
+    try:
+        from mypy.version import __version__
+    except ImportError:
+        return None
+    return __version__
+
+def get_cache_dir(mypy_version=None):
+    mypy_version = mypy_version or get_mypy_version()
+    if not mypy_version:
+        return None
+    xdg = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(xdg, 'pyls-bess', 'mypy-' + mypy_version)
+
+def find_cache_dir():
+    "Return the cache directory if it has been built for the current mypy."
+    cache_dir = get_cache_dir()
+    if not cache_dir:
+        return None
+    pyver = '%d.%d' % sys.version_info[:2]
+    meta = os.path.join(cache_dir, pyver, *MODULE.split('.'))
+    if not os.path.exists(meta + '.meta.json'):
+        return None
+    return cache_dir
+
+def get_workspace_cache_dir(root_path, mypy_version=None):
+    cache_dir = get_cache_dir(mypy_version)
+    if not cache_dir:
+        return None
+    digest = hashlib.sha1(root_path.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir + '-workspaces', digest)
+
+def seed_steps(root_path, done):
+    '''
+    Copy the prebuilt cache to the cache directory of the workspace.
+
+    Return the steps of a scheduler job, which calls `done(cache_dir)`
+    at the end.  Nothing is copied if the workspace already has its
+    cache, or if there is no prebuilt cache.
+    '''
+    import shutil
+
+    prebuilt = find_cache_dir()
+    if not prebuilt:
+        return
+    cache_dir = get_workspace_cache_dir(root_path)
+    if not os.path.isdir(cache_dir):
+        # Copied under a temporary name, so an interrupted copy is not
+        # mistaken for a cache.
+        tmp = '%s.%d.tmp' % (cache_dir, os.getpid())
+        try:
+            copied = 0
+            for dirpath, _, filenames in os.walk(prebuilt):
+                target = os.path.join(tmp, os.path.relpath(dirpath, prebuilt))
+                os.makedirs(target, exist_ok=True)
+                for filename in filenames:
+                    shutil.copy2(os.path.join(dirpath, filename), target)
+                    copied += 1
+                    if copied % COPY_STEP == 0:
+                        yield
+            os.rename(tmp, cache_dir)
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            # Another server might have seeded it in the meantime.
+            if not os.path.isdir(cache_dir):
+                log.warning('Cannot copy the mypy cache to %s: %s',
+                            cache_dir, e)
+                return
+    done(cache_dir)
+
+@contextlib.contextmanager
+def use_cache_dir(cache_dir):
+    "Type check with `cache_dir` in the current thread in this context."
+    local.cache_dir = cache_dir
+    try:
+        yield
+    finally:
+        local.cache_dir = None
+
+def patch_api():
+    "Make mypy.api.run(), called by pyls-mypy, respect use_cache_dir()."
+    from mypy import api
+    if getattr(api.run, 'bess_patched', False):
+        return
+    old_run = api.run
+    def run(args, *rest, **kw):
+        cache_dir = getattr(local, 'cache_dir', None)
+        if cache_dir:
+            args = ['--cache-dir', cache_dir] + list(args)
+        return old_run(args, *rest, **kw)
+    run.bess_patched = True
+    api.run = run
+
+def make_stub():
+    with open(get_mpath('globals.py')) as f:
+        src = f.read()
+    src = src.replace('\nbess = BESS()\n', '\nbess: BESS\n')
+    with open(get_mpath('globals.pyi'), 'w') as f:
+        f.write(src)
+    return get_mpath('globals.pyi')
+
+def build(cache_dir=None):
+    from mypy import api
+
+    cache_dir = cache_dir or get_cache_dir()
+    make_stub()
+    args = MYPY_ARGS + ['--cache-dir', cache_dir, '-m', MODULE]
+    stdout, stderr, status = api.run(args)
+    if status > 1:
+        raise RuntimeError(stderr or stdout)
+    return cache_dir
+
+if __name__ == '__main__':
+    if not get_mypy_version():
+        sys.exit('mypy is not installed')
+    print(build(*sys.argv[1:2]))
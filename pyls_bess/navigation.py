@@ -0,0 +1,184 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Navigation along the arrows of the pipelines.
+#
+# The upstream and downstream modules of a module are its neighbours in
+# the pipeline graph of the document, which are found in O(degree) time
+# with the CSR adjacency lists.  The workspace variants also look up
+# the module in the graphs of the other .bess files using it according
+# to the workspace index.
+#
+# The same answers are available as commands and as call hierarchy
+# items: the incoming calls of a module are its upstream modules, the
+# outgoing calls are the downstream modules.
+
+from pyls import lsp, uris
+
+from .graph import GATE_EXPR
+
+COMMANDS = {
+    'bess.upstream': (False, False),
+    'bess.downstream': (True, False),
+    'bess.workspace.upstream': (False, True),
+    'bess.workspace.downstream': (True, True),
+}
+
+def make_range(row, col, length):
+    return {
+        'start': {'line': row, 'character': col},
+        'end': {'line': row, 'character': col + length},
+    }
+
+def text_range(text, pos):
+    # Rows of the graph are rows of the desugared source.
+    return make_range(pos[0] - 1, pos[1], len(text.split('\n')[0]))
+
+def find_node(desugared, row, col):
+    "Return the node at (row, col) of the original source, or None."
+    graph = desugared.graph
+    node = graph.node_at(row + 1, col)
+    if node is not None:
+        return node
+    # The index is imported on first use, because the commands are
+    # listed at startup.
+    from .index import get_symbols
+    for kind, name, s_row, s_col, _ in get_symbols(desugared):
+        if (s_row == row and s_col <= col <= s_col + len(name)
+            and kind in ('module', 'name')):
+            return graph.node(name)
+    return None
+
+def neighbours(graph, node, downstream, gate=None):
+    "Return [(edge, node)] of the modules connected to `node`."
+    if downstream:
+        return [(e, graph.dst[e]) for e in graph.out_edges_of(node)
+                if gate is None or graph.ogate[e] == gate]
+    return [(e, graph.src[e]) for e in graph.in_edges_of(node)
+            if gate is None or graph.igate[e] == gate]
+
+def get_gate(graph, edge, name):
+    gate = getattr(graph, name)[edge]
+    if gate == GATE_EXPR:
+        return graph.gate_exprs[(edge, name)]
+    return gate
+
+def get_class(desugared, node):
+    "Return the class of `node`, also if it is only known from `x = C()`."
+    graph = desugared.graph
+    if graph.classes[node]:
+        return graph.classes[node]
+    # plugin.py imports this module.
+    from .plugin import instance_classes
+    return instance_classes(desugared).get(graph.names[node], '')
+
+def get_graphs(workspace, desugared_of, uri, key, workspace_wide):
+    '''
+    Yield (uri, desugared, node) of the module `key`.
+
+    `desugared_of(document)` returns the Desugared object of a document.
+    '''
+    path = uris.to_fs_path(uri)
+    paths = [path]
+    index = getattr(workspace, 'bess_index', None)
+    if workspace_wide and index and key.isidentifier():
+        found = index.find(key, kinds=('module', 'name'))
+        paths += sorted({p for p, *_ in found} - {path})
+    for path in paths:
+        uri = uris.from_fs_path(path)
+        desugared = desugared_of(workspace.get_document(uri))
+        node = desugared.graph.node(key)
+        if node is not None:
+            yield uri, desugared, node
+
+def connected_modules(workspace, desugared_of, uri, position,
+                      downstream, gate=None, workspace_wide=False):
+    '''
+    Return the modules connected to the module at `position`.
+
+    Each result is the location of the module at the other end of an
+    arrow with its name, class and gates.
+    '''
+    desugared = desugared_of(workspace.get_document(uri))
+    node = find_node(desugared, position['line'], position['character'])
+    if node is None:
+        return []
+    key = desugared.graph.node_keys[node]
+    result = []
+    for uri, desugared, node in get_graphs(workspace, desugared_of, uri,
+                                           key, workspace_wide):
+        graph = desugared.graph
+        for edge, other in neighbours(graph, node, downstream, gate):
+            c = graph.connections[edge]
+            pos = c.dst_pos if downstream else c.src_pos
+            result.append({
+                'uri': uri,
+                'range': text_range(graph.names[other], pos),
+                'name': graph.names[other],
+                'class': get_class(desugared, other),
+                'ogate': get_gate(graph, edge, 'ogate'),
+                'igate': get_gate(graph, edge, 'igate'),
+            })
+    return result
+
+def make_item(uri, desugared, node, detail=None):
+    graph = desugared.graph
+    name = graph.names[node]
+    named = graph.node_keys[node].isidentifier()
+    return {
+        'name': name.split('\n')[0],
+        'kind': lsp.SymbolKind.Variable if named else lsp.SymbolKind.Class,
+        'detail': detail or get_class(desugared, node),
+        'uri': uri,
+        'range': text_range(name, graph.positions[node]),
+        'selectionRange': text_range(name, graph.positions[node]),
+        'data': {'key': graph.node_keys[node]},
+    }
+
+def prepare_call_hierarchy(workspace, desugared_of, uri, position):
+    desugared = desugared_of(workspace.get_document(uri))
+    node = find_node(desugared, position['line'], position['character'])
+    if node is None:
+        return None
+    return [make_item(uri, desugared, node)]
+
+def hierarchy_calls(workspace, desugared_of, item, downstream):
+    '''
+    Return the incoming or outgoing calls of a call hierarchy item.
+
+    The ranges of the calls are the ranges of the arrows.  Arrows of
+    other files are not in the document of an outgoing call, so their
+    ranges are omitted.
+    '''
+    calls = []
+    for uri, desugared, node in get_graphs(workspace, desugared_of,
+                                           item['uri'], item['data']['key'],
+                                           True):
+        graph = desugared.graph
+        for edge, other in neighbours(graph, node, downstream):
+            c = graph.connections[edge]
+            detail = '%s %s -> %s' % (get_class(desugared, other),
+                                      get_gate(graph, edge, 'ogate'),
+                                      get_gate(graph, edge, 'igate'))
+            other_item = make_item(uri, desugared, other, detail.strip())
+            arrow = text_range('->', c.pos)
+            if downstream:
+                ranges = [arrow] if uri == item['uri'] else []
+                calls.append({'to': other_item, 'fromRanges': ranges})
+            else:
+                calls.append({'from': other_item, 'fromRanges': [arrow]})
+    return calls
@@ -0,0 +1,101 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Document symbols of a .bess document.
+#
+# The outline lists the pipelines (the connected components of the
+# arrow graph) with their module instances, then the remaining module
+# instances, the traffic classes and the workers.  It is computed from
+# the cached syntax tree and arrow graph of the desugared source.
+
+from pyls import lsp
+
+from .index import DEFINITION_KINDS, get_symbols
+
+SYMBOL_KINDS = {
+    'pipeline': lsp.SymbolKind.Module,
+    'module': lsp.SymbolKind.Variable,
+    'tc': lsp.SymbolKind.Namespace,
+    'worker': lsp.SymbolKind.Number,
+}
+CONTAINERS = {
+    'module': 'modules',
+    'tc': 'traffic classes',
+    'worker': 'workers',
+}
+
+def make_symbol(uri, name, kind, container, start, end):
+    return {
+        'name': name,
+        'kind': SYMBOL_KINDS[kind],
+        'containerName': container,
+        'location': {
+            'uri': uri,
+            'range': {
+                'start': {'line': start[0], 'character': start[1]},
+                'end': {'line': end[0], 'character': end[1]},
+            },
+        },
+    }
+
+def document_symbols(document, desugared):
+    '''
+    Return the SymbolInformation list of `document`.
+
+    Rows of the desugared source are converted to rows of the original
+    source.
+    '''
+    uri = document.uri
+    graph = desugared.graph
+    definitions = {}
+    others = []
+    for kind, name, row, col, is_def in get_symbols(desugared):
+        if not is_def or kind not in DEFINITION_KINDS:
+            continue
+        if kind == 'module':
+            definitions.setdefault(name, (row, col))
+        else:
+            others.append((kind, name, row, col))
+
+    symbols = []
+    pipelines = set()
+    for nodes in sorted(graph.components(),
+                        key=lambda nodes: graph.positions[nodes[0]]):
+        if len(nodes) < 2:
+            continue
+        label = 'pipeline %s' % graph.names[nodes[0]]
+        edges = [e for n in nodes for e in graph.out_edges_of(n)]
+        rows = [graph.connections[e].pos[0] - 1 for e in edges]
+        symbols.append(make_symbol(uri, label, 'pipeline', '',
+                                   (min(rows), 0), (max(rows) + 1, 0)))
+        for n in nodes:
+            name = graph.names[n]
+            pipelines.add(name)
+            row, col = graph.positions[n]
+            row, col = definitions.get(name, (row - 1, col))
+            symbols.append(make_symbol(uri, name, 'module', label,
+                                       (row, col), (row, col + len(name))))
+
+    for name, (row, col) in sorted(definitions.items(), key=lambda d: d[1]):
+        if name not in pipelines:
+            symbols.append(make_symbol(uri, name, 'module', 'modules',
+                                       (row, col), (row, col + len(name))))
+    for kind, name, row, col in others:
+        display_name = 'worker ' + name if kind == 'worker' else name
+        symbols.append(make_symbol(uri, display_name, kind, CONTAINERS[kind],
+                                   (row, col), (row, col + len(name))))
+    return symbols
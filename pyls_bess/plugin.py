@@ -15,11 +15,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import ast
 import collections
 import functools
-import gzip
-import inspect
-import json
 import logging
 import os
 import re
@@ -29,8 +27,10 @@ from threading import Timer
 from pyls import hookimpl, lsp, uris
 from pyls.config import config as pyls_config
 
+# The other modules of the package are imported when they are first
+# needed, so that loading the plugin is cheap in projects without .bess
+# files.
 from .bess_conf import BessConfig
-from .sugar import replace_rarrows, replace_double_colon
 
 log = logging.getLogger(__name__)
 
@@ -43,74 +43,244 @@ lint_ignored_regex = {}
 # Monkey patch :(
 # But this way it's easier to sync with upstream, and
 # config variable `bess.source_directory` can be used.
+#
+# Except for the capabilities, the patches are installed by
+# install_patches() when the plugin is activated, so that other
+# projects do not pay for the wrappers.
 from pyls.workspace import Workspace
 old_source_roots = Workspace.source_roots
 def new_source_roots(self, document_path):
     path = []
 
-    log.debug('bess new_source_roots %s', self.bess_dir)
-    if self.bess_dir:
-        path.append(self.bess_dir)
+    bess_dir = getattr(self, 'bess_dir', None)
+    log.debug('bess new_source_roots %s', bess_dir)
+    from .source_roots import get_source_roots
+    path.extend(get_source_roots(bess_dir))
 
     path.extend(old_source_roots(self, document_path))
     return path
-Workspace.source_roots = new_source_roots
 
 from pyls.workspace import Document
 old_source = Document.source
-@property
-def new_source(self):
-    '''
-    Return the source without the syntactic sugar of the bess language.
+old_apply_change = Document.apply_change
 
-    The code returned, however, is not a .bess to .py transformation.
-    It is more or less a syntactically correct python file, where
-    important column and line position are not altered.  So, instead
-    of transforming 'a->y:b' to 'a.connect(next_mod=b, igate=y)', it
-    transforms into 'a; y,b'.
+class BessDocument(Document):
     '''
+    A .bess document.
 
-    src = old_source.fget(self)
-    if not self.filename.endswith('.bess'):
-        return src
-
-    # Workspace.apply_change has this line:
-    #  self._source = self.source + text
-    # which modifies _source if we return the transformed source here.
-    stack = inspect.stack()
-    if 'apply_change' in [s.function for s in stack[1:3]]:
-        return src
-
-    import_line = 'from pyls_bess.bess_doc.globals import *'
-    if not src.startswith(import_line):
-        # Insert an extra line and adjust line numbers in return
-        # values later with fix_offset().
-        src = import_line + "\n" + src
-    src = re.sub(r'\$\w(\w*)!', "'\\1'+", src)
+    The documents of .bess files are created with this class by
+    new_create_document(), so the documents of other files are left
+    alone and use the upstream methods directly.
+    '''
 
-    src, self.bess_rows_with_sugar = replace_double_colon(src)
-    src, arrows = replace_rarrows(src)
-    for row, col in arrows:
-        self.bess_rows_with_sugar[row] = 1
+    # True while a change is applied to the original source.
+    bess_raw_view = False
+
+    @property
+    def source(self):
+        '''
+        Return the source without the syntactic sugar of the bess language.
+
+        The code returned, however, is not a .bess to .py transformation.
+        It is more or less a syntactically correct python file, where
+        important column and line position are not altered.  So, instead
+        of transforming 'a->y:b' to 'a.connect(next_mod=b, igate=y)', it
+        transforms into 'a; y,b'.
+        '''
+        with self._lock:
+            src = old_source.fget(self)
+            if self.bess_raw_view:
+                return src
+
+        from .timing import timed
+        with timed('new_source.desugar'):
+            return get_desugared(self, src).text
+
+    def apply_change(self, change):
+        # Workspace.apply_change has this line:
+        #  self._source = self.source + text
+        # which modifies _source if it gets the transformed source.
+        with self._lock:
+            self.bess_raw_view = True
+            try:
+                old_apply_change(self, change)
+            finally:
+                self.bess_raw_view = False
+            src = old_source.fget(self)
+        from . import worker
+        if worker.worker:
+            worker.prefetch(self.path, src, functools.partial(
+                put_prefetched, self.path))
+
+    @property
+    def bess_ast(self):
+        return get_desugared(self).tree
+
+    @property
+    def bess_tokens(self):
+        return get_desugared(self).tokens
+
+old_create_document = Workspace._create_document
+def new_create_document(self, doc_uri, source=None, version=None):
+    document = old_create_document(self, doc_uri, source, version)
+    if doc_uri.endswith('.bess'):
+        document.__class__ = BessDocument
+    return document
+
+def get_desugared(document, src=None):
+    '''
+    Return the cached result of desugaring the current source.
 
-    return src
-Document.source = new_source
+    The cache is invalidated when the source of the document changes.
+    '''
+    if src is None:
+        src = old_source.fget(document)
+    # Documents of closed files are created again on each request, so
+    # the results are cached by path instead of on the documents.
+    desugared_cache = get_desugared_cache()
+    desugared = desugared_cache.get(
+        document.path,
+        valid=lambda desugared: desugared.raw is src or desugared.raw == src)
+    if desugared is None:
+        from .worker import desugar_source
+        desugared = desugar_source(src, document.path)
+        desugared_cache.put(document.path, desugared)
+    document.bess_rows_with_sugar = desugared.rows_with_sugar
+    return desugared
+
+def put_prefetched(path, desugared):
+    "Cache a result of the worker, unless it has been computed here."
+    from . import caches
+    cache = get_desugared_cache()
+    with caches.lock:
+        current = cache.data.get(path)
+        if current is None or current.raw != desugared.raw:
+            cache.put(path, desugared)
+
+# Estimated size of the desugared source with its parsed tree, tokens,
+# graph and symbols, relative to the length of the source.
+DESUGARED_BYTES_PER_CHAR = 200
+desugared_cache = None
+def get_desugared_cache():
+    global desugared_cache
+    if desugared_cache is None:
+        from . import caches
+        with caches.lock:
+            if desugared_cache is None:
+                desugared_cache = caches.LRUCache(
+                    'plugin.desugared',
+                    sizeof=lambda path, desugared: (
+                        len(desugared.raw) * DESUGARED_BYTES_PER_CHAR))
+    return desugared_cache
 
 from pyls.python_ls import PythonLanguageServer
 old_hook = PythonLanguageServer._hook
+# Hooks not waited for by the user, they do not pause the background
+# jobs.
+BACKGROUND_HOOKS = ('pyls_lint', 'pyls_document_did_open',
+                    'pyls_document_did_save')
 def new_hook(self, hook_name, doc_uri=None, **kw):
     if doc_uri is None or not doc_uri.endswith('.bess'):
         return old_hook(self, hook_name, doc_uri, **kw)
+    if hook_name == 'pyls_lint':
+        # The linters run in a thread of their own.
+        from .profiling import profile_thread
+        with profile_thread():
+            return bess_hook(self, hook_name, doc_uri, **kw)
+    if hook_name in BACKGROUND_HOOKS:
+        return bess_hook(self, hook_name, doc_uri, **kw)
+    from . import scheduler
+    with scheduler.interactive():
+        return bess_hook(self, hook_name, doc_uri, **kw)
+
+def bess_hook(self, hook_name, doc_uri, **kw):
+    from .timing import timed
+
+    if hook_name == 'pyls_document_symbols':
+        # Skip jedi, the outline is computed from the cached parse.
+        workspace = (self._match_uri_to_workspace(doc_uri)
+                     if hasattr(self, '_match_uri_to_workspace')
+                     else self.workspace)
+        document = workspace.get_document(doc_uri)
+        from .outline import document_symbols
+        with timed('hook.' + hook_name):
+            return [document_symbols(document, get_desugared(document))]
 
     if 'position' in kw:
         kw['position']['line'] += 1
-    ret = old_hook(self, hook_name, doc_uri, **kw)
+    with timed('hook.' + hook_name):
+        ret = old_hook(self, hook_name, doc_uri, **kw)
     if 'position' in kw:
         kw['position']['line'] -= 1
 
     # Return values are adjusted back with 'hookwrappers' below
     return ret
-PythonLanguageServer._hook = new_hook
+
+old_capabilities = PythonLanguageServer.capabilities
+def new_capabilities(self):
+    from .semantic_tokens import LEGEND
+    capabilities = old_capabilities(self)
+    capabilities['workspaceSymbolProvider'] = True
+    capabilities['semanticTokensProvider'] = {
+        'legend': LEGEND,
+        'full': {'delta': True},
+    }
+    capabilities['callHierarchyProvider'] = True
+    return capabilities
+PythonLanguageServer.capabilities = new_capabilities
+
+old_did_close = PythonLanguageServer.m_text_document__did_close
+def new_did_close(self, textDocument=None, **kwargs):
+    uri = textDocument['uri']
+    if uri.endswith('.bess'):
+        get_desugared_cache().pop(uris.to_fs_path(uri))
+    return old_did_close(self, textDocument=textDocument, **kwargs)
+
+def cancel_scan(workspace):
+    index = getattr(workspace, 'bess_index', None)
+    if index:
+        index.cancel()
+
+# Missing before the multi-root workspaces of pyls.
+old_did_change_workspace_folders = getattr(
+    PythonLanguageServer, 'm_workspace__did_change_workspace_folders', None)
+def new_did_change_workspace_folders(self, event=None, **kwargs):
+    for removed in (event or {}).get('removed', []):
+        workspace = getattr(self, 'workspaces', {}).get(removed.get('uri'))
+        if workspace:
+            cancel_scan(workspace)
+    return old_did_change_workspace_folders(self, event=event, **kwargs)
+
+old_shutdown = PythonLanguageServer.m_shutdown
+def new_shutdown(self, **kwargs):
+    workspaces = getattr(self, 'workspaces', {}).values() or [self.workspace]
+    for workspace in workspaces:
+        cancel_scan(workspace)
+    from . import caches, worker
+    worker.stop()
+    import json
+    log.info('bess caches: %s', json.dumps(caches.report()))
+    return old_shutdown(self, **kwargs)
+
+patches_installed = False
+def install_patches():
+    global patches_installed
+    if patches_installed:
+        return
+    patches_installed = True
+    log.debug('bess install_patches')
+    Workspace.source_roots = new_source_roots
+    Workspace._create_document = new_create_document
+    PythonLanguageServer._hook = new_hook
+    PythonLanguageServer.m_text_document__did_close = new_did_close
+    if old_did_change_workspace_folders:
+        PythonLanguageServer.m_workspace__did_change_workspace_folders = \
+            new_did_change_workspace_folders
+    PythonLanguageServer.m_shutdown = new_shutdown
+    try:
+        patch_pyflakes_lint()
+    except ModuleNotFoundError:
+        pass
 
 
 ###########################################################################
@@ -131,18 +301,89 @@ def pyls_settings(config):
 
 @hookimpl
 def pyls_initialize(config, workspace):
-    workspace.bess_dir = get_spath(config)
-    log.debug('pyls_initialize bess_dir: %s', workspace.bess_dir)
+    workspace.bess_index = None
 
     global lint_ignored_regexs
     for module, messages in LINT_IGNORED_MESSAGES.items():
         pattern = "^(" + '|'.join(messages) + r')\b'
         lint_ignored_regex[module] = re.compile(pattern)
 
+    settings = config.plugin_settings('bess')
+    if settings.get('source_directory') or os.environ.get('BESS'):
+        activate(config, workspace)
+
+@hookimpl
+def pyls_document_did_open(config, workspace, document):
+    if document.uri.endswith('.bess'):
+        activate(config, workspace)
+        # The document was created before the activation.
+        if not isinstance(document, BessDocument):
+            document.__class__ = BessDocument
+            document._extra_sys_path = workspace.source_roots(document.path)
+
+def activate(config, workspace):
+    '''
+    Install the patches and start the services of the workspace.
+
+    This happens when the first .bess document is opened, or when the
+    location of bess is configured.
+    '''
+    install_patches()
+    if getattr(workspace, 'bess_active', False):
+        return
+    workspace.bess_active = True
+    workspace.bess_dir = get_spath(config)
+    log.debug('bess activate %s, bess_dir: %s', workspace.root_path,
+              workspace.bess_dir)
+
+    from . import caches, scheduler, timing
+    settings = config.plugin_settings('bess')
+    workspace.bess_mypy_cache_dir = None
+    if settings.get('mypy_cache', True):
+        from . import mypy_cache
+        scheduler.submit('mypy_cache.seed', mypy_cache.seed_steps(
+            workspace.root_path,
+            functools.partial(set_mypy_cache_dir, workspace)))
+
+    cache_budget = settings.get('cache_budget')
+    if cache_budget:
+        caches.budget.set_limit(cache_budget * 2**20)
+
+    timing_log = settings.get('timing_log')
+    if timing_log:
+        interval = settings.get('timing_log_interval') or 60
+        timing.start_dumps(os.path.expanduser(timing_log), interval)
+
+    bess_worker = None
+    if settings.get('worker'):
+        from . import worker
+        bess_worker = worker.start()
+
+    workspace.bess_index = None
+    if settings.get('index', True):
+        from .index import WorkspaceIndex
+        workspace.bess_index = WorkspaceIndex(workspace.root_path)
+        workspace.bess_index.worker = bess_worker
+        workers = settings.get('index_workers')
+        scheduler.submit('index.scan',
+                         workspace.bess_index.scan_steps(workers))
+
+    scheduler.submit('check_version', functools.partial(check_version,
+                                                        workspace))
+
+def set_mypy_cache_dir(workspace, cache_dir):
+    from . import mypy_cache
+    log.debug('mypy cache of %s: %s', workspace.root_path, cache_dir)
+    mypy_cache.patch_api()
+    workspace.bess_mypy_cache_dir = cache_dir
+
+def check_version(workspace):
+    "Warn if the bess sources do not match the globals DB."
     msg = None
     bessctl = Path(workspace.bess_dir) / 'bessctl'
     version_h = Path(workspace.bess_dir) / 'core' / 'version.h'
     version = 'unknown'
+    from .globals_db import get_globals_db
     db = get_globals_db()
     if not bessctl.exists():
         msg = f'Bess sources not found in {workspace.bess_dir}'
@@ -158,8 +399,14 @@ def pyls_initialize(config, workspace):
     # Wait until the connection-setup finishes.
     Timer(2, workspace.show_message, args=[msg, lsp.MessageType.Error]).start()
 
+# Wraps the diagnostics of every linter, including the bess-specific
+# ones in the other modules of this package.
 @hookimpl(hookwrapper=True)
 def pyls_lint(workspace, document):
+    if not document.uri.endswith('.bess'):
+        yield
+        return
+
     def keep_lint(l):
         # Filter messages that can be a result of the removal of the
         # syntactic sugar.
@@ -174,32 +421,332 @@ def pyls_lint(workspace, document):
             return False
         return True
 
-    outcome = yield
-    if not document.uri.endswith('.bess'):
-        return outcome
+    # The linters run in the background, so they can wait for the worker.
+    from .mypy_cache import use_cache_dir
+    from .worker import background
+    cache_dir = getattr(workspace, 'bess_mypy_cache_dir', None)
+    with background(), use_cache_dir(cache_dir):
+        outcome = yield
     try:
         result = outcome.get_result()
     except Exception as e:
         return
     filtered = []
-    for res in result:
-        filtered.append([fix_offset(r, document) for r in res if keep_lint(r)])
+    from .timing import timed
+    with timed('lint.filter'):
+        for res in result:
+            filtered.append([fix_offset(r, document)
+                             for r in res if keep_lint(r)])
     outcome.force_result(filtered)
 
+@hookimpl
+def pyls_document_did_save(workspace, document):
+    index = getattr(workspace, 'bess_index', None)
+    if not index or not document.uri.endswith('.bess'):
+        return
+    if index.update_file(document.path):
+        from . import scheduler
+        scheduler.submit('index.save', index.save, scheduler.NORMAL)
+
+def interactive(func):
+    "Pause the background jobs while `func` runs."
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not patches_installed:
+            # No background jobs without .bess files.
+            return func(*args, **kwargs)
+        from . import scheduler
+        with scheduler.interactive():
+            return func(*args, **kwargs)
+    return wrapper
+
+@hookimpl
+def pyls_dispatchers(workspace):
+    from . import navigation
+    dispatchers = {
+        'workspace/symbol': lambda params: workspace_symbols(
+            workspace, (params or {}).get('query', '')),
+        'textDocument/semanticTokens/full': lambda params: get_semantic_tokens(
+            workspace, params),
+        'textDocument/semanticTokens/full/delta':
+            lambda params: get_semantic_tokens(workspace, params, delta=True),
+        'textDocument/prepareCallHierarchy': lambda params: (
+            navigation.prepare_call_hierarchy(
+                workspace, get_desugared, params['textDocument']['uri'],
+                params['position'])
+            if params['textDocument']['uri'].endswith('.bess') else None),
+        'callHierarchy/incomingCalls': lambda params: (
+            navigation.hierarchy_calls(workspace, get_desugared,
+                                       params['item'], downstream=False)),
+        'callHierarchy/outgoingCalls': lambda params: (
+            navigation.hierarchy_calls(workspace, get_desugared,
+                                       params['item'], downstream=True)),
+    }
+    return {method: interactive(func) for method, func in dispatchers.items()}
+
+STATUS_COMMANDS = ('bess.timing', 'bess.timing.reset', 'bess.caches',
+                   'bess.scheduler')
+
+@hookimpl
+def pyls_commands(workspace):
+    from . import navigation, profiling
+    return (list(navigation.COMMANDS) + list(STATUS_COMMANDS)
+            + list(profiling.COMMANDS))
+
+@hookimpl
+def pyls_execute_command(config, workspace, command, arguments):
+    from . import caches, navigation, profiling, scheduler, timing
+    if command in navigation.COMMANDS:
+        # Arguments: uri, position and optionally a gate number.
+        downstream, workspace_wide = navigation.COMMANDS[command]
+        uri, position = arguments[:2]
+        gate = arguments[2] if len(arguments) > 2 else None
+        return navigation.connected_modules(
+            workspace, get_desugared, uri, position, downstream, gate,
+            workspace_wide)
+    if command == 'bess.timing':
+        return timing.report()
+    if command == 'bess.timing.reset':
+        timing.reset()
+    if command == 'bess.caches':
+        return caches.report()
+    if command == 'bess.scheduler':
+        return scheduler.report()
+    if command in profiling.COMMANDS:
+        settings = config.plugin_settings('bess')
+        return profiling.execute(command, settings.get('profile_directory'))
+    return None
+
+def get_semantic_tokens(workspace, params, delta=False):
+    uri = params['textDocument']['uri']
+    if not uri.endswith('.bess'):
+        return None
+    from . import semantic_tokens
+    document = workspace.get_document(uri)
+    desugared = get_desugared(document)
+    if delta:
+        return semantic_tokens.full_delta(document, desugared,
+                                          params.get('previousResultId'))
+    return semantic_tokens.full(document, desugared)
+
+WORKSPACE_SYMBOL_KINDS = {
+    'module': lsp.SymbolKind.Variable,
+    'tc': lsp.SymbolKind.Namespace,
+    'worker': lsp.SymbolKind.Number,
+}
+
+def workspace_symbols(workspace, query):
+    index = getattr(workspace, 'bess_index', None)
+    if not index:
+        return []
+    symbols = []
+    for display_name, name, path, kind, row, col, _ in index.search(query):
+        symbols.append({
+            'name': display_name,
+            'kind': WORKSPACE_SYMBOL_KINDS[kind],
+            'containerName': os.path.relpath(path, workspace.root_path),
+            'location': {
+                'uri': uris.from_fs_path(path),
+                'range': {
+                    'start': {'line': row, 'character': col},
+                    'end': {'line': row, 'character': col + len(name)},
+                },
+            },
+        })
+    return symbols
+
 @hookimpl(hookwrapper=True)
-def pyls_definitions(config, document):
+def pyls_definitions(config, workspace, document, position):
     outcome = yield
-    process_refs(config, document, 'definitions', outcome)
+    if not is_bess_doc(document):
+        return
+    from .timing import timed
+    with timed('process_refs.definitions'):
+        process_refs(config, document, 'definitions', outcome,
+                     workspace, position)
 
 @hookimpl(hookwrapper=True)
-def pyls_references(config, document, exclude_declaration=False):
+def pyls_references(config, workspace, document, position,
+                    exclude_declaration=False):
     outcome = yield
-    process_refs(config, document, 'references', outcome)
+    if not is_bess_doc(document):
+        return
+    from .timing import timed
+    with timed('process_refs.references'):
+        process_refs(config, document, 'references', outcome,
+                     workspace, position)
 
 @hookimpl(hookwrapper=True)
 def pyls_document_highlight(config, document):
     outcome = yield
-    process_refs(config, document, 'highlight', outcome)
+    if not is_bess_doc(document):
+        return
+    from .timing import timed
+    with timed('process_refs.highlight'):
+        process_refs(config, document, 'highlight', outcome)
+
+@hookimpl(tryfirst=True)
+def pyls_rename(workspace, document, position, new_name):
+    if not document.uri.endswith('.bess'):
+        return None
+    # Renaming with jedi or rope would write back the desugared source,
+    # so other symbols are not renamed.
+    from .rename import rename
+    return rename(workspace, document, get_desugared,
+                  position['line'] - 1, position['character'],
+                  new_name) or {'documentChanges': []}
+
+# Hover and signature help of known bess symbols are rendered from the
+# globals DB.  These run before jedi and, because the hooks are
+# firstresult, jedi is skipped whenever they return something.
+@hookimpl(tryfirst=True)
+def pyls_hover(document, position):
+    if not document.uri.endswith('.bess'):
+        return None
+    if position['line'] >= len(document.lines):
+        return None
+    line = document.lines[position['line']]
+    end = position['character']
+    while end < len(line) and (line[end].isalnum() or line[end] == '_'):
+        end += 1
+    symbol = find_bess_symbol(document, line[:end])
+    if not symbol:
+        return None
+    from .globals_db import get_markdown
+    md = get_markdown(*symbol)
+    return md and {'contents': {'kind': 'markdown', 'value': md}}
+
+@hookimpl(tryfirst=True)
+def pyls_signature_help(document, position):
+    if not document.uri.endswith('.bess'):
+        return None
+    row = position['line']
+    lines = document.lines[max(0, row - 20):row]
+    text = ''.join(lines)
+    if row < len(document.lines):
+        text += document.lines[row][:position['character']]
+    depth = 0
+    for paren in range(len(text) - 1, -1, -1):
+        if text[paren] in ')]}':
+            depth += 1
+        elif text[paren] in '([{':
+            if depth == 0:
+                break
+            depth -= 1
+    else:
+        return None
+    if text[paren] != '(':
+        return None
+    symbol = find_bess_symbol(document, text[:paren].rstrip())
+    if not symbol:
+        return None
+
+    from .globals_db import get_markdown, get_params, get_signature_label
+    params = get_params(*symbol)
+    args = split_args(text[paren + 1:])
+    active = len(args) - 1
+    match = re.match(r'\s*(\w+)\s*=', args[-1])
+    if match:
+        names = [p[0] for p in params]
+        if match.group(1) in names:
+            active = names.index(match.group(1))
+    return {
+        'signatures': [{
+            'label': get_signature_label(*symbol),
+            'documentation': {'kind': 'markdown',
+                              'value': get_markdown(*symbol)},
+            'parameters': [{
+                'label': '%s: %s' % (name, type_),
+                'documentation': doc,
+            } for name, type_, doc in params],
+        }],
+        'activeSignature': 0,
+        'activeParameter': active,
+    }
+
+def split_args(text):
+    args, depth, start = [], 0, 0
+    for i, c in enumerate(text):
+        if c in '([{':
+            depth += 1
+        elif c in ')]}':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            args.append(text[start:i])
+            start = i + 1
+    args.append(text[start:])
+    return args
+
+def find_bess_symbol(document, text):
+    '''
+    Return (mclass_name, cmd_name) of the word at the end of `text`.
+
+    cmd_name is None if the word is a module class or driver.  The
+    receiver of a command is either a constructor call, like in
+    'Queue().set_size', or a module instance assigned in the document.
+    '''
+    from .globals_db import get_cmd, get_mclass
+    match = re.search(r'(\w+)$', text)
+    if not match:
+        return None
+    word = match.group(1)
+    rest = text[:match.start()].rstrip()
+    if not rest.endswith('.'):
+        return (word, None) if get_mclass(word) else None
+
+    receiver = rest[:-1].rstrip()
+    if receiver.endswith(')'):
+        depth = 0
+        for i in range(len(receiver) - 1, -1, -1):
+            depth += {')': 1, '(': -1}.get(receiver[i], 0)
+            if depth == 0:
+                break
+        receiver = receiver[:i].rstrip()
+    match = re.search(r'(\w+)$', receiver)
+    if not match:
+        return None
+    mclass = find_instance_class(document, match.group(1))
+    if mclass and get_cmd(mclass, word):
+        return (mclass, word)
+    return None
+
+def find_instance_class(document, name):
+    from .globals_db import get_mclass
+    if get_mclass(name):
+        return name
+    if document.bess_ast is not None:
+        return get_instance_classes(document).get(name)
+    # The source cannot be parsed while the user is typing, so fall
+    # back to a regexp.  'q::Queue()' is already desugared to 'q= Queue()'.
+    regex = r'\b%s\s*=\s*(\w+)\s*\(' % re.escape(name)
+    for match in re.finditer(regex, document.source):
+        if get_mclass(match.group(1)):
+            return match.group(1)
+    return None
+
+def get_instance_classes(document):
+    "Return {name: mclass_name} of the module instances of the document."
+    return instance_classes(get_desugared(document))
+
+def instance_classes(desugared):
+    "Return {name: mclass_name} of the instances assigned in `desugared`."
+    from .globals_db import get_mclass
+    instances = getattr(desugared, 'instances', None)
+    if instances is not None:
+        return instances
+    instances = {}
+    tree = desugared.tree
+    for node in ast.walk(tree) if tree else ():
+        if not (isinstance(node, ast.Assign)
+                and isinstance(node.value, ast.Call)
+                and isinstance(node.value.func, ast.Name)
+                and get_mclass(node.value.func.id)):
+            continue
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                instances.setdefault(target.id, node.value.func.id)
+    desugared.instances = instances
+    return instances
 
 def fix_offset(d, document=None):
     if d.get('uri', document.uri).endswith('.bess'):
@@ -207,7 +754,23 @@ def fix_offset(d, document=None):
         d['range']['end']['line'] -= 1
     return d
 
-def process_refs(config, document, goto_kind, outcome):
+def fix_link(d):
+    "Point `d` to the bess tree instead of the source root of jedi."
+    from .source_roots import real_path
+    uri = d.get('uri')
+    if uri and uri.startswith('file:'):
+        path = uris.to_fs_path(uri)
+        resolved = real_path(path)
+        if resolved != path:
+            d['uri'] = uris.from_fs_path(resolved)
+    return d
+
+def is_bess_doc(document):
+    return document.uri.endswith('.bess')
+
+def process_refs(config, document, goto_kind, outcome,
+                 workspace=None, position=None):
+    from .timing import timed
     defs = []
     try:
         result = outcome.get_result()
@@ -216,16 +779,63 @@ def process_refs(config, document, goto_kind, outcome):
         return
 
     for l in result:
-        defs.extend( [fix_offset(d, document) for d in l] )
+        defs.extend( [fix_link(fix_offset(d, document)) for d in l] )
+
+    if position:
+        with timed('process_refs.index'):
+            defs.extend(get_index_refs(workspace, document, goto_kind,
+                                       position, defs))
 
     if goto_kind != 'highlight':
-        defs = insert_bess_refs(config, document, goto_kind, defs)
+        with timed('process_refs.insert_bess_refs'):
+            defs = insert_bess_refs(config, document, goto_kind, defs,
+                                    workspace)
 
     outcome.force_result([[d for d in defs if d]])
 
+def get_index_refs(workspace, document, goto_kind, position, known=()):
+    '''
+    Return the locations of the symbol at `position` missing from `known`.
+
+    The symbols of the document itself are taken from its current
+    source, those of the other files from the workspace index.  Module
+    instances of other files belong to other pipelines, so only their
+    traffic classes and workers are returned, like in rename.py.
+    '''
+    name = document.word_at_position(position)
+    if not name:
+        return []
+    from .index import get_symbols
+    definitions_only = goto_kind == 'definitions'
+    found = [(document.path, kind, row, col, is_def)
+             for kind, s_name, row, col, is_def
+             in get_symbols(get_desugared(document))
+             if s_name == name and (is_def or not definitions_only)]
+    index = getattr(workspace, 'bess_index', None)
+    if index:
+        found += [s for s in index.find(name, definitions_only=definitions_only)
+                  if s[0] != document.path and s[1] not in ('module', 'name')]
+    seen = {ref_key(ref) for ref in known}
+    refs = []
+    for path, kind, row, col, is_def in found:
+        ref = {
+            'uri': (document.uri if path == document.path
+                    else uris.from_fs_path(path)),
+            'range': {
+                'start': {'line': row, 'character': col},
+                'end': {'line': row, 'character': col + len(name)},
+            }
+        }
+        if ref_key(ref) not in seen:
+            seen.add(ref_key(ref))
+            refs.append(ref)
+    return refs
+
 def get_spath(config, document=None, filename=None):
+    from .timing import timed
     document_path = document and document.path
-    settings = config.plugin_settings('bess', document_path=document_path)
+    with timed('config.plugin_settings'):
+        settings = config.plugin_settings('bess', document_path=document_path)
     bess_dir = os.environ.get('BESS', '')
     bess_dir = settings.get('source_directory', bess_dir)
     bess_dir = os.path.abspath(bess_dir)
@@ -233,27 +843,11 @@ def get_spath(config, document=None, filename=None):
         return os.path.join(bess_dir, filename)
     return bess_dir
 
-def get_mpath(filename=None):
-    p = os.path
-    path = p.realpath(p.join(p.dirname(__file__), 'bess_doc'))
-    if filename:
-        return p.join(path, filename)
-    return path
-
-db = {}
-def get_globals_db():
-    global db
-    if not db:
-        with gzip.open(get_mpath('globals.min.json.gz')) as f:
-            db = json.load(f)
-        msg_full = {m['fullName']: m for m in db['msg']}
-        msg_short = {m['name']: m for m in db['msg']}
-        db['msg'] = msg_short
-        db['msg_full'] = msg_full
-    return db
-
 def get_ref_types(config, document, goto_kind):
-    settings = config.plugin_settings('bess', document_path=document.path)
+    from .timing import timed
+    with timed('config.plugin_settings'):
+        settings = config.plugin_settings('bess',
+                                          document_path=document.path)
     ref_types = settings.get(goto_kind)
     if not ref_types:
         # Should keep this synchronized with
@@ -269,6 +863,7 @@ def get_ref_types(config, document, goto_kind):
                 "globals",
                 "protobuf",
                 "examples",
+                "workspace",
             ],
         }
         ref_types = defaults.get(goto_kind, [])
@@ -277,6 +872,7 @@ def get_ref_types(config, document, goto_kind):
 
 def make_abs_bess_filename(config, document, filename):
     if type(filename) == int:
+        from .globals_db import get_globals_db, get_mpath
         db = get_globals_db()
         if filename == 0:
             filename = get_mpath(db['files'][str(filename)])
@@ -298,11 +894,18 @@ def conv_loc(config, document, loc):
         }
     }
 
-def insert_bess_refs(config, document, goto_kind, refs):
+def ref_key(ref):
+    start = ref['range']['start']
+    return ref['uri'], start['line'], start['character']
+
+def insert_bess_refs(config, document, goto_kind, refs, workspace=None):
+    from .globals_db import get_globals_db, get_mpath
     ref_groups = collections.defaultdict(list)
     globals_uri = uris.uri_with(document.uri,
                                 path=get_mpath('globals.py'))
     db = get_globals_db()
+    # The workspace group only adds the locations not found otherwise.
+    seen = {ref_key(ref) for ref in refs}
     for ref in refs:
         if not (ref['uri'] == globals_uri):
             ref_groups['project'].append(ref)
@@ -332,6 +935,24 @@ def insert_bess_refs(config, document, goto_kind, refs):
                 ref = conv_loc(config, document, loc)
                 ref_groups['examples'].append(ref)
 
+            index = getattr(workspace, 'bess_index', None)
+            if index:
+                name = mclass['name']
+                if cmd is not mclass:
+                    name += '.' + cmd['cmd']
+                length = len(name.split('.')[-1])
+                for path, _, row, col, _ in index.find(name):
+                    ref = {
+                        'uri': uris.from_fs_path(path),
+                        'range': {
+                            'start': {'line': row, 'character': col},
+                            'end': {'line': row, 'character': col + length},
+                        }
+                    }
+                    if ref_key(ref) not in seen:
+                        seen.add(ref_key(ref))
+                        ref_groups['workspace'].append(ref)
+
     refs = []
     for ref_type in get_ref_types(config, document, goto_kind):
         refs += ref_groups[ref_type]
@@ -366,7 +987,24 @@ def patch_pyflakes_lint():
             old_flake(self, message)
     DiagReport.flake = new_flake
 
-try:
-    patch_pyflakes_lint()
-except ModuleNotFoundError:
-    pass
+    # Reuse the syntax tree of the desugared source instead of parsing
+    # it again.
+    import pyflakes.api
+    import pyflakes.checker
+    from pyls.plugins import pyflakes_lint
+    class BessPyflakesApi:
+        def __getattr__(self, name):
+            return getattr(pyflakes.api, name)
+
+        def check(self, codeString, filename, reporter=None):
+            desugared = get_desugared_cache().get(filename)
+            if (not filename.endswith('.bess') or desugared is None
+                or desugared.tree is None
+                or desugared.text.encode('utf-8') != codeString):
+                return pyflakes.api.check(codeString, filename, reporter)
+            w = pyflakes.checker.Checker(desugared.tree, filename=filename)
+            w.messages.sort(key=lambda m: m.lineno)
+            for message in w.messages:
+                reporter.flake(message)
+            return len(w.messages)
+    pyflakes_lint.pyflakes_api = BessPyflakesApi()
@@ -0,0 +1,166 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# cProfile and tracemalloc captures of the running server.
+#
+# Nothing is imported or hooked until a capture is started, so there is
+# no overhead otherwise.  The profiler covers the whole server: before
+# python 3.12 a profiler runs only in the thread enabling it, so the
+# thread of the start command (handling the LSP requests) gets one, and
+# the work of the other threads (the slices of the background jobs, the
+# linters) is profiled in profile_thread() contexts.  These profiles
+# are merged when the capture stops, a context still running then is
+# left out.
+#
+# Next to the .prof and .snapshot files, a summary is written to a .txt
+# file, where the functions and allocations of pyls_bess (desugaring,
+# the index, the hooks) are listed separately from the rest.
+
+import contextlib
+import io
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+COMMANDS = ('bess.profile.start', 'bess.profile.stop',
+            'bess.tracemalloc.start', 'bess.tracemalloc.stop')
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+profiler = None
+# Finished profile_thread() profiles of the running capture.
+thread_profilers = []
+lock = threading.Lock()
+# cProfile uses sys.monitoring since python 3.12, which covers every
+# thread.
+PER_THREAD = sys.version_info < (3, 12)
+
+def get_directory(directory=None):
+    if not directory:
+        xdg = (os.environ.get('XDG_CACHE_HOME')
+               or os.path.expanduser('~/.cache'))
+        directory = os.path.join(xdg, 'pyls-bess', 'profiles')
+    directory = os.path.expanduser(directory)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def get_path(directory, suffix):
+    name = 'pyls-bess-%d-%s%s' % (os.getpid(),
+                                  time.strftime('%Y%m%d-%H%M%S'), suffix)
+    return os.path.join(get_directory(directory), name)
+
+def start_profile():
+    global profiler
+    if profiler:
+        return False
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return True
+
+@contextlib.contextmanager
+def profile_thread():
+    "Profile the current thread in this context if a capture is running."
+    capture = profiler
+    # The thread of the start command is already profiled.
+    if not (capture and PER_THREAD) or sys.getprofile() is not None:
+        yield
+        return
+    import cProfile
+    thread_profiler = cProfile.Profile()
+    thread_profiler.enable()
+    try:
+        yield
+    finally:
+        thread_profiler.disable()
+        with lock:
+            if profiler is capture:
+                thread_profilers.append(thread_profiler)
+
+def stop_profile(directory=None):
+    "Stop profiling.  Return the path of the .prof file or None."
+    global profiler
+    if not profiler:
+        return None
+    import pstats
+    stopped, profiler = profiler, None
+    stopped.disable()
+    with lock:
+        others = thread_profilers[:]
+        thread_profilers.clear()
+    out = io.StringIO()
+    stats = pstats.Stats(stopped, stream=out)
+    for other in others:
+        try:
+            stats.add(other)
+        except TypeError:
+            # Nothing was recorded.
+            pass
+    path = get_path(directory, '.prof')
+    stats.dump_stats(path)
+    stats.sort_stats('cumulative')
+    out.write('pyls_bess functions:\n')
+    stats.print_stats(re.escape(PACKAGE_DIR), 40)
+    out.write('All functions:\n')
+    stats.print_stats(40)
+    with open(path + '.txt', 'w') as f:
+        f.write(out.getvalue())
+    log.debug('profile written to %s', path)
+    return path
+
+def start_tracemalloc(frames=10):
+    import tracemalloc
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(frames)
+    return True
+
+def stop_tracemalloc(directory=None):
+    "Stop tracing.  Return the path of the .snapshot file or None."
+    import tracemalloc
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    path = get_path(directory, '.snapshot')
+    snapshot.dump(path)
+    ours = snapshot.filter_traces(
+        [tracemalloc.Filter(True, os.path.join(PACKAGE_DIR, '*'))])
+    with open(path + '.txt', 'w') as f:
+        for title, snap in (('pyls_bess allocations', ours),
+                            ('All allocations', snapshot)):
+            f.write('%s:\n' % title)
+            for stat in snap.statistics('lineno')[:40]:
+                f.write('%s\n' % stat)
+    log.debug('tracemalloc snapshot written to %s', path)
+    return path
+
+def execute(command, directory=None):
+    if command == 'bess.profile.start':
+        return start_profile()
+    if command == 'bess.profile.stop':
+        return stop_profile(directory)
+    if command == 'bess.tracemalloc.start':
+        return start_tracemalloc()
+    if command == 'bess.tracemalloc.stop':
+        return stop_tracemalloc(directory)
+    return None
@@ -0,0 +1,121 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Rename of module instances and traffic classes of .bess files.
+#
+# The occurrences are the symbols of the workspace index, so the files
+# are not read again.  Open documents are used instead of the index,
+# because their sources might not be saved.  Index symbols are already
+# in the coordinates of the original source, and the column of a
+# traffic class is the column after the opening quote, so the edits
+# replace exactly the old names.
+#
+# A module instance is renamed only in its own document: another file
+# defining an instance with the same name belongs to another pipeline.
+# A traffic class is renamed in every file, because the traffic classes
+# of the scripts share the same tree.
+
+import os
+
+from pyls import uris
+
+from .index import get_symbols
+
+def find_symbol(symbols, row, col):
+    "Return (kind, name) of the module or tc symbol at (row, col)."
+    for kind, name, s_row, s_col, _ in symbols:
+        if (s_row == row and s_col <= col <= s_col + len(name)
+            and kind in ('module', 'name', 'tc')):
+            return kind, name
+    return None
+
+def is_module(symbols, name):
+    return any(s[0] == 'module' and s[1] == name for s in symbols)
+
+def get_workspace_symbols(workspace, desugared_of):
+    '''
+    Return {path: symbols} of the .bess files of the workspace.
+
+    `desugared_of(document)` returns the Desugared object of an open
+    document.
+    '''
+    files = {}
+    index = getattr(workspace, 'bess_index', None)
+    if index:
+        for path in list(index.files):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if index.is_stale(path, stat):
+                # Modified outside of the editor.
+                index.update_file(path)
+        with index.lock:
+            files = {path: entry['symbols']
+                     for path, entry in index.files.items()}
+    for document in list(workspace.documents.values()):
+        if document.uri.endswith('.bess'):
+            files[document.path] = get_symbols(desugared_of(document))
+    return files
+
+def rename(workspace, document, desugared_of, row, col, new_name):
+    '''
+    Return the WorkspaceEdit renaming the symbol at (row, col).
+
+    Return None if there is no module instance or traffic class there.
+    '''
+    symbols = get_symbols(desugared_of(document))
+    found = find_symbol(symbols, row, col)
+    if not found:
+        return None
+    kind, name = found
+    if kind == 'name':
+        if not is_module(symbols, name):
+            return None
+        kind = 'module'
+    if kind == 'module':
+        if not new_name.isidentifier():
+            raise ValueError('Invalid module name: %r' % new_name)
+        kinds = ('module', 'name')
+        files = {document.path: symbols}
+    else:
+        kinds = ('tc',)
+        files = get_workspace_symbols(workspace, desugared_of)
+        files[document.path] = symbols
+
+    changes = []
+    for path, file_symbols in sorted(files.items()):
+        edits = [{
+            'range': {
+                'start': {'line': s_row, 'character': s_col},
+                'end': {'line': s_row, 'character': s_col + len(name)},
+            },
+            'newText': new_name,
+        } for s_kind, s_name, s_row, s_col, _ in file_symbols
+                 if s_name == name and s_kind in kinds]
+        if not edits:
+            continue
+        uri = uris.from_fs_path(path)
+        doc = workspace.get_maybe_document(uri)
+        changes.append({
+            'textDocument': {
+                'uri': uri,
+                'version': doc.version if doc else None,
+            },
+            'edits': edits,
+        })
+    return {'documentChanges': changes}
@@ -0,0 +1,182 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Scheduler of the background jobs.
+#
+# Background jobs (the workspace scan, saving the index, loading the
+# globals DB) run one at a time in a single thread.  A job is an
+# iterator, each step of it is a small piece of work.  Steps are run
+# until the time slice of the job is used up, then the job with the
+# highest priority class runs next.  No step is started while an
+# interactive request for a .bess document is being served, so the
+# jobs do not compete with completions for the GIL.
+#
+# The time spent in the queue, the pauses and the slices are recorded
+# in the histograms of timing.py, the queue depth is reported by the
+# bess.scheduler command.
+
+import collections
+import contextlib
+import logging
+import threading
+import time
+
+from .profiling import profile_thread
+from .timing import record
+
+log = logging.getLogger(__name__)
+
+HIGH, NORMAL, LOW = range(3)
+PRIORITY_NAMES = ('high', 'normal', 'low')
+SLICE_MS = 20
+
+class Job:
+
+    def __init__(self, name, steps, priority):
+        self.name = name
+        self.steps = steps
+        self.priority = priority
+        self.submitted = time.perf_counter()
+        self.started = False
+
+def call(func, *args):
+    "Return the steps of a job running `func(*args)` at once."
+    func(*args)
+    yield
+
+class Scheduler:
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.queues = [collections.deque() for _ in PRIORITY_NAMES]
+        self.interactive_requests = 0
+        self.running = None
+        self.max_queued = 0
+        self.done = 0
+        self.thread = None
+
+    def submit(self, name, steps, priority=LOW):
+        '''
+        Queue a job.
+
+        `steps` is an iterator, or a function called in a single step.
+        '''
+        if callable(steps):
+            steps = call(steps)
+        with self.cond:
+            self.queues[priority].append(Job(name, iter(steps), priority))
+            self.max_queued = max(self.max_queued, self.queued())
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run,
+                                               name='pyls-bess-scheduler',
+                                               daemon=True)
+                self.thread.start()
+            self.cond.notify_all()
+
+    def queued(self):
+        return sum(len(q) for q in self.queues)
+
+    @contextlib.contextmanager
+    def interactive(self):
+        "Pause the background jobs while in this context."
+        with self.cond:
+            self.interactive_requests += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.interactive_requests -= 1
+                self.cond.notify_all()
+
+    def next_job(self):
+        "Wait for a job and an idle server.  Called with the lock held."
+        while True:
+            job = next((q[0] for q in self.queues if q), None)
+            if job and not self.interactive_requests:
+                return self.queues[job.priority].popleft()
+            self.cond.wait()
+
+    def wait_idle(self):
+        "Wait until no interactive request is being served.  Return the wait."
+        with self.cond:
+            if not self.interactive_requests:
+                return 0
+            start = time.perf_counter()
+            while self.interactive_requests:
+                self.cond.wait()
+        paused = time.perf_counter() - start
+        record('scheduler.paused', paused * 1000)
+        return paused
+
+    def run(self):
+        while True:
+            with self.cond:
+                job = self.next_job()
+                self.running = job
+            now = time.perf_counter()
+            if not job.started:
+                job.started = True
+                record('scheduler.wait.' + PRIORITY_NAMES[job.priority],
+                       (now - job.submitted) * 1000)
+            with profile_thread():
+                finished = self.run_slice(job)
+            with self.cond:
+                self.running = None
+                if finished:
+                    self.done += 1
+                else:
+                    self.queues[job.priority].append(job)
+
+    def run_slice(self, job):
+        "Run the steps of `job` for a slice.  Return True if it is done."
+        start = time.perf_counter()
+        deadline = start + SLICE_MS / 1000
+        paused = 0
+        finished = False
+        try:
+            while True:
+                # The pauses are not part of the slice.
+                wait = self.wait_idle()
+                paused += wait
+                deadline += wait
+                next(job.steps)
+                if time.perf_counter() >= deadline:
+                    break
+        except StopIteration:
+            finished = True
+        except Exception:
+            log.exception('background job %s failed', job.name)
+            finished = True
+        record('scheduler.slice',
+               (time.perf_counter() - start - paused) * 1000)
+        return finished
+
+    def report(self):
+        with self.cond:
+            return {
+                'queued': {name: len(q)
+                           for name, q in zip(PRIORITY_NAMES, self.queues)},
+                'max_queued': self.max_queued,
+                'running': self.running and self.running.name,
+                'interactive_requests': self.interactive_requests,
+                'done': self.done,
+            }
+
+scheduler = Scheduler()
+submit = scheduler.submit
+interactive = scheduler.interactive
+report = scheduler.report
@@ -0,0 +1,170 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Semantic tokens of a .bess document.
+#
+# The arrows, the gates and the '::' operators are highlighted from the
+# positions recorded by sugar.desugar(), module instances, module
+# classes and commands from the symbols of the index.  Both are cached
+# on the Desugared object, so nothing is parsed here.
+#
+# The last result of each document is kept, so a delta request is
+# answered with a single edit replacing the changed middle part of the
+# token data.
+
+import itertools
+import re
+
+from .graph import GATE_EXPR, parse_gate
+
+TOKEN_TYPES = ['operator', 'variable', 'class', 'method', 'number']
+TOKEN_MODIFIERS = ['declaration', 'defaultLibrary']
+LEGEND = {'tokenTypes': TOKEN_TYPES, 'tokenModifiers': TOKEN_MODIFIERS}
+
+TYPES = {t: i for i, t in enumerate(TOKEN_TYPES)}
+DECLARATION = 1
+DEFAULT_LIBRARY = 2
+
+# Length of a token data entry.
+ENTRY_SIZE = 5
+
+NAME_RE = re.compile(r'\w+$')
+COLON_RE = re.compile(r':\s*')
+
+result_ids = itertools.count(1)
+
+def get_tokens(desugared):
+    '''
+    Return the sorted, non-overlapping [(row, col, length, type, modifiers)]
+    tokens of `desugared`.  Rows are rows of the original source.
+    '''
+    lines = desugared.raw.splitlines()
+    tokens = {}
+
+    def add(row, col, length, type_, modifiers=0):
+        if 0 <= row < len(lines) and length > 0:
+            tokens.setdefault((row, col), (length, TYPES[type_], modifiers))
+
+    # Rows of the desugared source are one more than the original ones.
+    for row, col in desugared.arrows:
+        add(row - 1, col, 2, 'operator')
+    for c in desugared.connections:
+        if c.ogate_pos:
+            row, col = c.ogate_pos[0] - 1, c.ogate_pos[1]
+            add(row, col, 1, 'operator')
+            match = COLON_RE.match(lines[row], col) if row < len(lines) else None
+            if (match and parse_gate(c.ogate) != GATE_EXPR
+                and lines[row].startswith(c.ogate, match.end())):
+                add(row, match.end(), len(c.ogate), 'number')
+        if c.igate_pos:
+            row, col = c.igate_pos[0] - 1, c.igate_pos[1]
+            add(row, col, 1, 'operator')
+            before = lines[row][:col].rstrip() if row < len(lines) else ''
+            if parse_gate(c.igate) != GATE_EXPR and before.endswith(c.igate):
+                add(row, len(before) - len(c.igate), len(c.igate), 'number')
+    for row in desugared.rows_with_sugar:
+        line = lines[row - 1] if 0 < row <= len(lines) else ''
+        for match in re.finditer('::', line):
+            add(row - 1, match.start(), 2, 'operator')
+
+    # The legend is needed at startup, the index is not.
+    from .index import get_symbols
+    modules = set()
+    for kind, name, row, col, is_def in get_symbols(desugared):
+        if kind == 'module':
+            modules.add(name)
+            add(row, col, len(name), 'variable', DECLARATION)
+        elif kind == 'name' and name in modules:
+            add(row, col, len(name), 'variable')
+        elif kind == 'mclass':
+            add(row, col, len(name), 'class', DEFAULT_LIBRARY)
+        elif kind == 'cmd':
+            method = name.split('.')[-1]
+            add(row, col, len(method), 'method', DEFAULT_LIBRARY)
+
+    # The tree is missing while the source has syntax errors, but the
+    # arrow graph still knows the modules of the pipelines.
+    graph = desugared.graph
+    for name, mclass, (row, col) in zip(graph.names, graph.classes,
+                                        graph.positions):
+        if NAME_RE.match(name):
+            add(row - 1, col, len(name), 'variable')
+        elif mclass and name.startswith(mclass):
+            add(row - 1, col, len(mclass), 'class', DEFAULT_LIBRARY)
+
+    result = []
+    end = (-1, 0)
+    for (row, col), (length, type_, modifiers) in sorted(tokens.items()):
+        if (row, col) < end:
+            continue
+        result.append((row, col, length, type_, modifiers))
+        end = (row, col + length)
+    return result
+
+def encode(tokens):
+    "Return the relative encoding of `tokens` defined by LSP."
+    data = []
+    last_row = last_col = 0
+    for row, col, length, type_, modifiers in tokens:
+        if row != last_row:
+            last_col = 0
+        data += [row - last_row, col - last_col, length, type_, modifiers]
+        last_row, last_col = row, col
+    return data
+
+def get_data(desugared):
+    data = getattr(desugared, 'semantic_tokens', None)
+    if data is None:
+        data = encode(get_tokens(desugared))
+        desugared.semantic_tokens = data
+    return data
+
+def make_edit(old, new):
+    "Return the edit replacing the changed middle part of `old`."
+    n = min(len(old), len(new))
+    start = 0
+    while start < n and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < n - start and old[-1 - end] == new[-1 - end]:
+        end += 1
+    # Keep the edit aligned to whole tokens.
+    start -= start % ENTRY_SIZE
+    end -= end % ENTRY_SIZE
+    return {'start': start, 'deleteCount': len(old) - start - end,
+            'data': new[start:len(new) - end]}
+
+def full(document, desugared):
+    data = get_data(desugared)
+    result_id = str(next(result_ids))
+    document.bess_semantic_tokens = (result_id, data)
+    return {'resultId': result_id, 'data': data}
+
+def full_delta(document, desugared, previous_result_id):
+    '''
+    Return the edits since the result `previous_result_id`.
+
+    Return all the tokens if that result is not the last one.
+    '''
+    last_id, old = getattr(document, 'bess_semantic_tokens', (None, None))
+    if last_id is None or last_id != previous_result_id:
+        return full(document, desugared)
+    data = get_data(desugared)
+    result_id = str(next(result_ids))
+    document.bess_semantic_tokens = (result_id, data)
+    edits = [] if old == data else [make_edit(old, data)]
+    return {'resultId': result_id, 'edits': edits}
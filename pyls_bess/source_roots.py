@@ -0,0 +1,97 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Source roots of jedi for the bess sources.
+#
+# globals.py imports pybess only, so instead of the whole bess checkout
+# (C++ sources, DPDK, tests), jedi gets a directory containing nothing
+# but a `pybess` link to the pybess directory of bess.  The generated
+# protobuf modules import each other without the package prefix, so
+# their directories are added as well.  The roots are computed once per
+# bess directory.
+#
+# The bundled stubs of pybess come first, so jedi infers from them and
+# uses the bess tree only to jump to the sources.  Locations under the
+# link are mapped back to the bess tree by real_path().
+
+import hashlib
+import logging
+import os
+
+from .caches import lru_cache
+from .stubs import find_stubs_dir
+
+log = logging.getLogger(__name__)
+
+PACKAGE = 'pybess'
+# Directories of the generated *_pb2.py modules inside pybess.
+PROTOBUF_DIRS = ('builtin_pb', 'plugin_pb')
+
+def get_roots_dir():
+    xdg = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(xdg, 'pyls-bess', 'roots')
+
+def get_link_dir(bess_dir):
+    digest = hashlib.sha1(bess_dir.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(get_roots_dir(), digest)
+
+def real_path(path):
+    "Return the location in the bess tree of a `path` under a link."
+    if path.startswith(get_roots_dir() + os.sep):
+        return os.path.realpath(path)
+    return path
+
+def make_link_dir(bess_dir):
+    '''
+    Return a directory with a link to the pybess directory of `bess_dir`.
+
+    Return None if the link cannot be created.
+    '''
+    target = os.path.join(bess_dir, PACKAGE)
+    link_dir = get_link_dir(bess_dir)
+    link = os.path.join(link_dir, PACKAGE)
+    try:
+        if os.path.islink(link) and os.readlink(link) == target:
+            return link_dir
+        os.makedirs(link_dir, exist_ok=True)
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(target, link)
+    except OSError as e:
+        log.warning('Cannot link %s to %s: %s', link, target, e)
+        return None
+    return link_dir
+
+@lru_cache('source_roots.get_source_roots', maxsize=16)
+def get_source_roots(bess_dir):
+    "Return the directories of `bess_dir` to be searched by jedi."
+    roots = []
+    stubs_dir = find_stubs_dir()
+    if stubs_dir:
+        roots.append(stubs_dir)
+    package_dir = os.path.join(bess_dir or '', PACKAGE)
+    if not bess_dir or not os.path.isdir(package_dir):
+        return tuple(roots)
+    link_dir = make_link_dir(bess_dir)
+    # Without a link, fall back to the whole tree.
+    roots.append(link_dir or bess_dir)
+    for name in PROTOBUF_DIRS:
+        path = os.path.join(package_dir, name)
+        if os.path.isdir(path):
+            roots.append(path)
+    log.debug('bess source roots of %s: %s', bess_dir, roots)
+    return tuple(roots)
@@ -0,0 +1,120 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Bundled stubs of pybess.
+#
+# bess_doc/stubs/pybess-stubs contains .pyi files of the pybess modules
+# imported by globals.py.  Jedi prefers a `pybess-stubs` package on its
+# search path to the sources of pybess, so completions and hover work
+# without parsing the bess tree, or even without a bess checkout.
+#
+# The first line of the stubs is the version of their format, the
+# second one is the bess version they were made from.  Stubs of another
+# format, or of a bess version different from the version of the
+# globals DB, are not used.  The bundled stubs follow the pybess of the
+# bess version of the globals DB, so they have to be updated (and
+# stamped) with the DB.  Stubs can be generated from a bess checkout:
+#
+#   python3 -m pyls_bess.stubs BESS_DIR
+
+import logging
+import os
+import re
+import sys
+import tempfile
+
+from .globals_db import get_mpath
+
+log = logging.getLogger(__name__)
+
+PACKAGE = 'pybess-stubs'
+MODULES = ('pybess.module', 'pybess.port', 'pybess.bess')
+FORMAT = 1
+HEADER = '# pyls-bess stubs format: %d\n' % FORMAT
+HEADER_RE = re.compile(r'# pyls-bess stubs format: (\d+)')
+VERSION = '# Based on bess version: %s\n'
+VERSION_RE = re.compile(r'# Based on bess version: (\S+)')
+
+def get_stubs_dir():
+    return get_mpath('stubs')
+
+def get_version(stubs_dir=None):
+    '''
+    Return (format, bess version) of the stubs.
+
+    Both are None if there are no stubs.
+    '''
+    init = os.path.join(stubs_dir or get_stubs_dir(), PACKAGE, '__init__.pyi')
+    try:
+        with open(init) as f:
+            format_match = HEADER_RE.match(f.readline())
+            version_match = VERSION_RE.match(f.readline())
+    except OSError:
+        return None, None
+    return (format_match and int(format_match.group(1)),
+            version_match and version_match.group(1))
+
+stubs_dir = False
+def find_stubs_dir():
+    "Return the directory of the stubs if they can be used."
+    global stubs_dir
+    if stubs_dir is False:
+        stubs_dir = None
+        format_, version = get_version()
+        if format_ != FORMAT:
+            log.warning('pybess stubs of format %s are not supported', format_)
+            return None
+        from .globals_db import get_globals_db
+        db_version = get_globals_db()['bess-version']
+        if version != db_version:
+            log.warning('pybess stubs of %s do not match the globals DB '
+                        'of %s', version, db_version)
+            return None
+        stubs_dir = get_stubs_dir()
+    return stubs_dir
+
+def get_bess_version(bess_dir):
+    with open(os.path.join(bess_dir, 'core', 'version.h')) as f:
+        match = re.search(r'"(.*)"', f.read())
+    return match.group(1)
+
+def build(bess_dir, stubs_dir=None):
+    from mypy import stubgen
+
+    stubs_dir = stubs_dir or get_stubs_dir()
+    header = HEADER + VERSION % get_bess_version(bess_dir)
+    package_dir = os.path.join(stubs_dir, PACKAGE)
+    with tempfile.TemporaryDirectory() as tmp:
+        args = ['--no-import', '--search-path', bess_dir, '-o', tmp]
+        for module in MODULES:
+            args += ['-m', module]
+        stubgen.main(args)
+        os.makedirs(package_dir, exist_ok=True)
+        with open(os.path.join(package_dir, '__init__.pyi'), 'w') as f:
+            f.write(header)
+        for module in MODULES:
+            name = module.split('.')[-1] + '.pyi'
+            with open(os.path.join(tmp, 'pybess', name)) as f:
+                src = f.read()
+            with open(os.path.join(package_dir, name), 'w') as f:
+                f.write(header + '\n' + src)
+    return package_dir
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit('usage: python3 -m pyls_bess.stubs BESS_DIR [STUBS_DIR]')
+    print(build(*sys.argv[1:3]))
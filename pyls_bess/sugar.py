@@ -31,11 +31,17 @@
 
 # based on bess/bessctl/sugar.py
 
+import ast
+import bisect
+import collections
 import io
 import parser
 import re
 import tokenize
 
+from .caches import approx_size, lru_cache
+from .timing import timed
+
 def is_gate_expr(exp, is_ogate):
     # check if the leading/trailing whitespace characters contains '\n'
     if is_ogate:
@@ -55,7 +61,21 @@ def is_gate_expr(exp, is_ogate):
     else:
         return True
 
-def replace_rarrows(s):
+# A connection made by an arrow.  `src` and `dst` are the source texts
+# of the modules, `ogate` and `igate` are the source texts of the gates
+# (or None).  Positions are (row, col) pairs.  The position of a gate
+# is the position of its colon.
+Connection = collections.namedtuple('Connection', [
+    'pos', 'src', 'src_pos', 'ogate', 'ogate_pos',
+    'igate', 'igate_pos', 'dst', 'dst_pos'])
+
+def replace_rarrows(s, connections=None):
+    '''
+    Replace arrows in `s`.  Return the new text and the arrow positions.
+
+    If `connections` is a list, Connection objects describing the
+    arrows are appended to it.
+    '''
     # Phase 1: split the string with delimiter "->"
     # (cannot simply use .split() as lexical analysis is required)
     last_token = None
@@ -108,6 +128,9 @@ def replace_rarrows(s):
         else:
             assert False
     segments.append(''.join(curr_seg))
+    orig_segments = list(segments)
+    ogates = [None] * len(arrows)
+    igates = [None] * len(arrows)
 
     # Phase 2: transform output gate (:xx ->) and input gate (-> :yy) parts
     for i in range(len(segments) - 1):
@@ -122,6 +145,7 @@ def replace_rarrows(s):
 
             if is_gate_expr(ogate, True):
                 segments[i] = seg[:colon_pos] + ',' + ogate
+                ogates[i] = colon_pos
                 break
 
             colon_pos = seg.rfind(':', 0, colon_pos)
@@ -137,22 +161,258 @@ def replace_rarrows(s):
             if is_gate_expr(igate, False):
                 segments[
                     i + 1] = igate + ',' + seg[colon_pos + 1:]
+                igates[i] = colon_pos
                 break
 
             colon_pos = seg.find(':', colon_pos + 1)
 
+    if connections is not None:
+        connections.extend(
+            make_connections(lines, arrows, orig_segments, ogates, igates))
     return '; '.join(segments), arrows
 
-def replace_double_colon(s):
+def make_connections(lines, arrows, segments, ogates, igates):
+    line_offsets = [0]
+    for line in lines:
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    def to_pos(offset):
+        row = bisect.bisect_right(line_offsets, offset) - 1
+        return (row, offset - line_offsets[row])
+
+    seg_offsets = [0]
+    for row, col in arrows:
+        seg_offsets.append(line_offsets[row] + col + 2)
+
+    for i, arrow in enumerate(arrows):
+        left, right = segments[i], segments[i + 1]
+        ogate = igate = ogate_pos = igate_pos = None
+        if ogates[i] is not None:
+            ogate = left[ogates[i] + 1:].strip()
+            ogate_pos = to_pos(seg_offsets[i] + ogates[i])
+            left = left[:ogates[i]]
+        if igates[i] is not None:
+            igate = right[:igates[i]].strip()
+            igate_pos = to_pos(seg_offsets[i + 1] + igates[i])
+            start = igates[i] + 1
+        else:
+            start = 0
+        src_start = statement_start(left)
+        src = left[src_start:]
+        dst_end = statement_end(right, start)
+        dst = right[start:dst_end]
+        src_pos = seg_offsets[i] + src_start + len(src) - len(src.lstrip())
+        dst_pos = seg_offsets[i + 1] + start + len(dst) - len(dst.lstrip())
+        yield Connection(arrow, src.strip(), to_pos(src_pos), ogate, ogate_pos,
+                         igate, igate_pos, dst.strip(), to_pos(dst_pos))
+
+# Simple heuristics to find the module expressions around an arrow:
+# the module ends at a newline, a ';' or a ':', which are not inside
+# brackets.  Brackets in strings are not handled.
+def statement_start(seg):
+    depth = 0
+    for i in range(len(seg) - 1, -1, -1):
+        c = seg[i]
+        if c in ')]}':
+            depth += 1
+        elif c in '([{':
+            if depth == 0:
+                return i + 1
+            depth -= 1
+        elif depth == 0 and c in ';:':
+            return i + 1
+        elif depth == 0 and c == '\n' and not seg[:i].endswith('\\'):
+            if seg[i + 1:].strip():
+                return i + 1
+    return 0
+
+def statement_end(seg, start=0):
+    depth = 0
+    for i in range(start, len(seg)):
+        c = seg[i]
+        if c in '([{':
+            depth += 1
+        elif c in ')]}':
+            if depth == 0:
+                return i
+            depth -= 1
+        elif depth == 0 and c in ';#':
+            return i
+        elif depth == 0 and c == '\n' and not seg[:i].endswith('\\'):
+            if seg[start:i].strip():
+                return i
+    return len(seg)
+
+# 'q::Queue()' declares the module instance q of class Queue.
+DECLARATION_RE = re.compile(r'(\w+)\s*::\s*(\w+)\s*\(')
+
+def replace_double_colon(s, declarations=None):
+    '''
+    Replace '::' with '= '.  Return the text and {row: 1} of the rows.
+
+    If `declarations` is given, {name: mclass_name} of the declared
+    module instances are added to it.
+    '''
     rows = {}
     text = ''
     for row, line in enumerate(io.StringIO(s).readlines()):
+        if declarations is not None and '::' in line:
+            for name, mclass in DECLARATION_RE.findall(line):
+                declarations.setdefault(name, mclass)
         line, cnt = re.subn(r'::', '= ', line)
         text += line
         if cnt:
             rows[row] = 1
     return text, rows
 
+IMPORT_LINE = 'from pyls_bess.bess_doc.globals import *'
+
+class Desugared:
+    '''
+    Result of desugar().
+
+    `tree` and `tokens` are parsed from `text` only when first needed,
+    so pyflakes and the analyses of pyls_bess share a single parse.
+    Similarly, `graph` is built from the connections of the arrows and
+    the `declarations` ({name: mclass_name}) of the 'q::Queue()' lines.
+    '''
+
+    def __init__(self, raw, text, rows_with_sugar, arrows, connections,
+                 declarations=None):
+        self.raw = raw
+        self.text = text
+        self.rows_with_sugar = rows_with_sugar
+        self.arrows = arrows
+        self.connections = connections
+        self.declarations = declarations or {}
+
+    @property
+    def graph(self):
+        if not hasattr(self, '_graph'):
+            from .graph import PipelineGraph
+            self._graph = PipelineGraph(self.connections, self.declarations)
+        return self._graph
+
+    @property
+    def tree(self):
+        if not hasattr(self, '_tree'):
+            try:
+                self._tree = ast.parse(self.text)
+            except (SyntaxError, ValueError):
+                self._tree = None
+        return self._tree
+
+    @property
+    def tokens(self):
+        if not hasattr(self, '_tokens'):
+            self._tokens = []
+            readline = io.StringIO(self.text).readline
+            try:
+                for t in tokenize.generate_tokens(readline):
+                    self._tokens.append(t)
+            except (tokenize.TokenError, IndentationError):
+                pass
+        return self._tokens
+
+def desugar(src):
+    raw = src
+    if not src.startswith(IMPORT_LINE):
+        # Insert an extra line and adjust line numbers in return
+        # values later with fix_offset().
+        src = IMPORT_LINE + "\n" + src
+    with timed('desugar.dollar'):
+        src = re.sub(r'\$\w(\w*)!', "'\\1'+", src)
+
+    declarations = {}
+    with timed('desugar.double_colon'):
+        src, rows_with_sugar = replace_double_colon(src, declarations)
+
+    with timed('desugar.split'):
+        chunks = split_statements(src)
+
+    # Arrows are replaced statement by statement, so after an edit
+    # only the changed statements are processed again.  The statements
+    # missing from the cache are timed in desugar_statement().
+    texts, arrows, connections = [], [], []
+    row = 0
+    with timed('desugar.statements'):
+        for chunk in chunks:
+            text, chunk_arrows, chunk_connections = desugar_statement(chunk)
+            texts.append(text)
+            for arrow_row, col in chunk_arrows:
+                arrows.append((arrow_row + row, col))
+                rows_with_sugar[arrow_row + row] = 1
+            connections.extend(shift_connection(c, row)
+                               for c in chunk_connections)
+            row += chunk.count('\n')
+
+    return Desugared(raw, ''.join(texts), rows_with_sugar, arrows,
+                     connections, declarations)
+
+@lru_cache('sugar.statements', maxsize=4096,
+           sizeof=lambda key, value: approx_size((key, value)))
+def desugar_statement(s):
+    connections = []
+    with timed('desugar.statement_miss'):
+        text, arrows = replace_rarrows(s, connections)
+    return text, tuple(arrows), tuple(connections)
+
+def shift_connection(connection, rows):
+    if not rows:
+        return connection
+    fields = {}
+    for name in ('pos', 'src_pos', 'ogate_pos', 'igate_pos', 'dst_pos'):
+        pos = getattr(connection, name)
+        if pos:
+            fields[name] = (pos[0] + rows, pos[1])
+    return connection._replace(**fields)
+
+SPLIT_RE = re.compile(r'''\\[\s\S]|"""|\'\'\'|"|'|#|[()\[\]{}]''')
+CONTINUATION_RE = re.compile(r'(else|elif|except|finally)\b|[\s#)\]}]|$')
+
+def split_statements(s):
+    "Split `s` into chunks of complete top-level statements."
+    chunks = []
+    current = []
+    depth = 0
+    quote = None
+    continued = False
+    decorator = False
+    for line in s.splitlines(True):
+        if (current and not depth and not quote and not continued
+            and not decorator and not CONTINUATION_RE.match(line)):
+            chunks.append(''.join(current))
+            current = []
+        current.append(line)
+        if not quote and line.strip():
+            decorator = line.startswith('@')
+        continued = False
+        for match in SPLIT_RE.finditer(line):
+            token = match.group()
+            if quote:
+                # A triple quote closes a single quoted string, and
+                # the rest of it is an empty string.
+                if token.startswith(quote):
+                    quote = None
+                elif token[0] == '\\' and token[1] in '\r\n':
+                    continued = True
+            elif token == '#':
+                break
+            elif token in ('"""', "'''", '"', "'"):
+                quote = token
+            elif token in '([{':
+                depth += 1
+            elif token in ')]}':
+                depth = max(depth - 1, 0)
+            elif token[0] == '\\' and token[1] in '\r\n':
+                continued = True
+        if quote in ('"', "'") and not continued:
+            # Unterminated string literal.
+            quote = None
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
 
 if __name__ == '__main__':
     s = """
@@ -0,0 +1,129 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Latency histograms of the stages of the .bess wrappers.
+#
+# Each stage has a histogram with fixed buckets in milliseconds, so
+# recording a sample is a bisect and a few additions.  Percentiles are
+# approximated with the upper bounds of the buckets.
+
+import bisect
+import contextlib
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+              1000, 2500, 5000, 10000)
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, p):
+        needed = p * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= needed and count:
+                if i < len(BUCKETS_MS):
+                    return min(BUCKETS_MS[i], round(self.max, 3))
+                return round(self.max, 3)
+        return round(self.max, 3)
+
+    def to_dict(self):
+        buckets = {}
+        for i, count in enumerate(self.counts):
+            if count:
+                bound = BUCKETS_MS[i] if i < len(BUCKETS_MS) else 'inf'
+                buckets['<=%s' % bound] = count
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0,
+            'max_ms': round(self.max, 3),
+            'p50_ms': self.percentile(0.5),
+            'p90_ms': self.percentile(0.9),
+            'p99_ms': self.percentile(0.99),
+            'buckets': buckets,
+        }
+
+histograms = {}
+lock = threading.Lock()
+
+def record(name, ms):
+    with lock:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        histogram.add(ms)
+
+@contextlib.contextmanager
+def timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+
+def report():
+    "Return {stage: histogram summary}."
+    with lock:
+        return {name: h.to_dict() for name, h in sorted(histograms.items())}
+
+def reset():
+    with lock:
+        histograms.clear()
+
+def dump(path):
+    "Append the report as a JSON line to `path`."
+    import json
+    line = json.dumps({'time': time.time(), 'pid': os.getpid(),
+                       'histograms': report()})
+    with open(path, 'a') as f:
+        f.write(line + '\n')
+
+dump_thread = None
+def start_dumps(path, interval):
+    "Dump the report to `path` every `interval` seconds."
+    global dump_thread
+    if dump_thread:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                dump(path)
+            except OSError as e:
+                log.warning('Cannot write timing log %s: %s', path, e)
+                return
+
+    dump_thread = threading.Thread(target=run, daemon=True)
+    dump_thread.start()
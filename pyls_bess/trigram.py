@@ -0,0 +1,79 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Fuzzy search of names with a trigram index.
+#
+# Candidates of a query are the names sharing at least half of the
+# trigrams of the query, so a typo or two does not prevent a match.
+# Queries shorter than three characters are matched as subsequences.
+
+import collections
+from array import array
+
+def get_trigrams(s):
+    s = '  ' + s.lower() + ' '
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+def is_subsequence(query, name):
+    it = iter(name)
+    return all(c in it for c in query)
+
+class TrigramIndex:
+
+    def __init__(self, names):
+        self.names = sorted(set(names))
+        self.lower = [name.lower() for name in self.names]
+        postings = collections.defaultdict(list)
+        for i, name in enumerate(self.lower):
+            for trigram in get_trigrams(name):
+                postings[trigram].append(i)
+        self.postings = {t: array('i', ids) for t, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.names)
+
+    def score(self, query, i, shared=0):
+        name = self.lower[i]
+        if name == query:
+            return 0
+        if name.startswith(query):
+            return 1
+        if query in name:
+            return 2
+        if is_subsequence(query, name):
+            return 3
+        return 4 + 1.0 / (shared + 1)
+
+    def search(self, query, limit=100):
+        "Return the names matching `query`, the best matches first."
+        query = query.lower()
+        if not query:
+            return self.names[:limit]
+        if len(query) < 3:
+            found = [(self.score(query, i), i)
+                     for i, name in enumerate(self.lower)
+                     if is_subsequence(query, name)]
+        else:
+            trigrams = get_trigrams(query)
+            counts = collections.Counter()
+            for trigram in trigrams:
+                counts.update(self.postings.get(trigram, ()))
+            needed = (len(trigrams) + 1) // 2
+            found = [(self.score(query, i, n), i)
+                     for i, n in counts.items() if n >= needed]
+        found.sort(key=lambda f: (f[0], len(self.names[f[1]]), f[1]))
+        return [self.names[i] for _, i in found[:limit]]
@@ -0,0 +1,297 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Optional worker process for desugaring and indexing.
+#
+# With `bess.worker`, the workspace scan and the desugaring of very
+# large documents run in a subprocess, so they do not compete with the
+# JSON-RPC loop for the GIL.  Jobs and results are sent over a
+# multiprocessing Pipe.  The results are compact: index entries are
+# lists, a desugared source comes back as its text, the arrow positions
+# in an array, the connections as tuples and the pipeline graph with
+# its arrays.
+#
+# Requests never wait for the worker.  When a large document changes,
+# its new source is sent to the worker right away; a scheduler job puts
+# the result in the cache when it arrives.  A request finding no result
+# yet desugars the source itself.  Only the linters, which run in the
+# background, wait for the worker.
+#
+# The worker runs queued desugaring jobs before indexing jobs.  If the
+# process dies, the pending jobs fail with WorkerError, the callers do
+# the work themselves, and the process is started again for the next
+# job.  After MAX_RESTARTS crashes the worker is not used any more.
+
+import array
+import concurrent.futures
+import contextlib
+import heapq
+import itertools
+import logging
+import multiprocessing
+import threading
+
+log = logging.getLogger(__name__)
+
+# Smaller documents are desugared in the server.
+DESUGAR_MIN_CHARS = 256 * 1024
+MAX_RESTARTS = 5
+# Lower runs first.
+PRIORITY = {'desugar': 0, 'index_files': 1}
+
+class WorkerError(Exception):
+    pass
+
+###########################################################################
+# The worker process
+
+def run_desugar(src):
+    from .sugar import desugar
+    desugared = desugar(src)
+    graph = desugared.graph
+    graph.connections = None
+    return (desugared.text, desugared.rows_with_sugar,
+            array.array('i', itertools.chain.from_iterable(desugared.arrows)),
+            [tuple(c) for c in desugared.connections],
+            desugared.declarations, graph)
+
+def run_index_files(paths_and_hashes):
+    from .index import index_files
+    return index_files(paths_and_hashes)
+
+JOBS = {
+    'desugar': run_desugar,
+    'index_files': run_index_files,
+}
+
+def serve(conn):
+    queue = []
+    seq = itertools.count()
+    while True:
+        try:
+            # Wait for a job if there is nothing to do, otherwise only
+            # collect the jobs already sent.
+            while not queue or conn.poll():
+                job_id, name, args = conn.recv()
+                heapq.heappush(queue, (PRIORITY[name], next(seq),
+                                       job_id, name, args))
+        except (EOFError, OSError):
+            return
+        _, _, job_id, name, args = heapq.heappop(queue)
+        try:
+            response = (job_id, True, JOBS[name](*args))
+        except Exception as e:
+            response = (job_id, False, '%s: %s' % (type(e).__name__, e))
+        try:
+            conn.send(response)
+        except (EOFError, OSError):
+            return
+
+###########################################################################
+# The server side
+
+class Worker:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.process = None
+        self.conn = None
+        self.pending = {}
+        self.ids = itertools.count()
+        self.restarts = 0
+        self.disabled = False
+
+    def start(self):
+        "Start the process.  Called with the lock held."
+        # Forking a threaded server is not safe.
+        context = multiprocessing.get_context('spawn')
+        conn, child_conn = context.Pipe()
+        process = context.Process(target=serve, args=(child_conn,),
+                                  name='pyls-bess-worker', daemon=True)
+        process.start()
+        child_conn.close()
+        self.process, self.conn = process, conn
+        threading.Thread(target=self.read, args=(conn, process),
+                         daemon=True).start()
+        log.debug('bess worker started: %s', process.pid)
+
+    def submit(self, name, *args):
+        "Send a job to the worker.  Return a Future of its result."
+        future = concurrent.futures.Future()
+        with self.lock:
+            if self.disabled:
+                future.set_exception(WorkerError('worker is disabled'))
+                return future
+            if self.process is None:
+                self.start()
+            job_id = next(self.ids)
+            self.pending[job_id] = future
+            try:
+                self.conn.send((job_id, name, args))
+            except (OSError, ValueError) as e:
+                # The reader thread notices the exit of the process, and
+                # the next job starts a new one.
+                del self.pending[job_id]
+                future.set_exception(WorkerError(str(e)))
+        return future
+
+    def read(self, conn, process):
+        while True:
+            try:
+                job_id, ok, result = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                future = self.pending.pop(job_id, None)
+            if future is None or not future.set_running_or_notify_cancel():
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(WorkerError(result))
+
+        with self.lock:
+            if self.process is not process:
+                # Stopped.
+                return
+            self.process = self.conn = None
+            pending, self.pending = self.pending, {}
+            self.restarts += 1
+            if self.restarts > MAX_RESTARTS:
+                self.disabled = True
+        process.join(1)
+        log.warning('bess worker %s exited with %s (restarts: %d)',
+                    process.pid, process.exitcode, self.restarts)
+        for future in pending.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(WorkerError('worker process exited'))
+
+    def stop(self):
+        with self.lock:
+            process, conn = self.process, self.conn
+            self.process = self.conn = None
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.cancel()
+        if process is None:
+            return
+        conn.close()
+        process.join(1)
+        if process.is_alive():
+            process.terminate()
+
+worker = None
+# {path: (source, Future)} of the latest desugaring job of the documents.
+prefetched = {}
+# {path: (source, done)} of the changes arriving while a job is running.
+prefetch_queue = {}
+prefetch_lock = threading.Lock()
+local = threading.local()
+
+def start():
+    "Return the worker, create it first if necessary."
+    global worker
+    if worker is None:
+        worker = Worker()
+    return worker
+
+def stop():
+    global worker
+    if worker:
+        worker.stop()
+        worker = None
+    with prefetch_lock:
+        prefetched.clear()
+        prefetch_queue.clear()
+
+@contextlib.contextmanager
+def background():
+    "Let desugar_source() wait for the worker in this context."
+    local.background = True
+    try:
+        yield
+    finally:
+        local.background = False
+
+def load_desugared(raw, result):
+    "Return the Desugared object of a result of run_desugar()."
+    from .sugar import Connection, Desugared
+    text, rows_with_sugar, arrows, connections, declarations, graph = result
+    connections = [Connection._make(c) for c in connections]
+    desugared = Desugared(raw, text, rows_with_sugar,
+                          list(zip(arrows[::2], arrows[1::2])), connections,
+                          declarations)
+    graph.connections = connections
+    desugared._graph = graph
+    return desugared
+
+def prefetch(path, src, done):
+    '''
+    Start desugaring `src` of `path` in the worker, if it is large.
+
+    When the result arrives, `done(desugared)` is called in a scheduler
+    job, unless a newer source of `path` has been sent since then.
+    '''
+    if worker is None or len(src) < DESUGAR_MIN_CHARS:
+        return
+    with prefetch_lock:
+        _, future = prefetched.get(path, (None, None))
+        if future and not future.done():
+            # Only the latest change is sent when the job finishes.
+            prefetch_queue[path] = (src, done)
+            return
+        future = worker.submit('desugar', src)
+        prefetched[path] = (src, future)
+
+    def load():
+        if prefetched.get(path, (None, None))[1] is future:
+            done(load_desugared(src, future.result()))
+
+    def on_done(future):
+        with prefetch_lock:
+            queued = prefetch_queue.pop(path, None)
+        if queued:
+            prefetch(path, *queued)
+        elif not future.cancelled() and not future.exception():
+            from . import scheduler
+            scheduler.submit('worker.desugar', load, scheduler.HIGH)
+    future.add_done_callback(on_done)
+
+def desugar_source(src, path=None):
+    '''
+    Desugar `src`, in the worker if it is running and `src` is large.
+
+    Outside of background() the worker is not waited for: its result is
+    used only if it has already arrived.
+    '''
+    from .sugar import desugar
+    if worker is None or len(src) < DESUGAR_MIN_CHARS:
+        return desugar(src)
+    wait = getattr(local, 'background', False)
+    future = None
+    old_src, old_future = prefetched.get(path, (None, None))
+    if old_src is src or old_src == src:
+        future = old_future
+    elif wait:
+        future = worker.submit('desugar', src)
+    if future is None or not (wait or future.done()):
+        return desugar(src)
+    try:
+        return load_desugared(src, future.result())
+    except (WorkerError, concurrent.futures.CancelledError) as e:
+        log.debug('bess worker cannot desugar: %r', e)
+        return desugar(src)
@@ -15,7 +15,11 @@ setup(
     packages=find_packages(exclude=['resources']),
     install_requires=['python-language-server', 'pycodestyle'],
     extras_require={},
-    entry_points={'pyls': ['pyls_bess = pyls_bess.plugin']},
+    entry_points={'pyls': [
+        'pyls_bess = pyls_bess.plugin',
+        'pyls_bess_dmypy = pyls_bess.dmypy',
+        'pyls_bess_lint = pyls_bess.lint',
+    ]},
     include_package_data=True,
     package_data={'bess_doc': ['pyls_bess/bess_doc/*']},
     classifiers=[
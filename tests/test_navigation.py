@@ -0,0 +1,69 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pyls import uris
+
+from pyls_bess.navigation import (connected_modules, hierarchy_calls,
+                                  prepare_call_hierarchy)
+from pyls_bess.sugar import desugar
+
+SRC = '''q::Queue()
+src::Source() -> q -> Sink()
+'''
+URI = uris.from_fs_path('/tmp/test.bess')
+
+class Workspace:
+    bess_index = None
+
+    def get_document(self, uri):
+        return SRC
+
+def test_declared_instance_class():
+    graph = desugar(SRC).graph
+    assert graph.classes[graph.node('q')] == 'Queue'
+
+def test_upstream_of_declared_instance():
+    # 'Sink()' at row 1.
+    modules = connected_modules(Workspace(), desugar, URI,
+                                {'line': 1, 'character': 24},
+                                downstream=False)
+    assert [(m['name'], m['class']) for m in modules] == [('q', 'Queue')]
+
+ASSIGNED_SRC = '''q = Queue()
+src = Source()
+src -> q -> Sink()
+'''
+
+class AssignedWorkspace(Workspace):
+
+    def get_document(self, uri):
+        return ASSIGNED_SRC
+
+def test_downstream_of_assigned_instance():
+    # 'src' at row 2.
+    modules = connected_modules(AssignedWorkspace(), desugar, URI,
+                                {'line': 2, 'character': 0},
+                                downstream=True)
+    assert [(m['name'], m['class']) for m in modules] == [('q', 'Queue')]
+
+def test_call_hierarchy_of_assigned_instance():
+    workspace = AssignedWorkspace()
+    item, = prepare_call_hierarchy(workspace, desugar, URI,
+                                   {'line': 2, 'character': 7})
+    assert item['detail'] == 'Queue'
+    calls = hierarchy_calls(workspace, desugar, item, downstream=False)
+    assert [c['from']['detail'] for c in calls] == ['Source 0 -> 0']
@@ -0,0 +1,32 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import glob
+import os
+
+from pyls_bess import stubs
+from pyls_bess.globals_db import get_globals_db
+
+def test_bundled_stubs_match_globals_db():
+    # Update and stamp the stubs when the globals DB is updated.
+    db_version = get_globals_db()['bess-version']
+    assert stubs.get_version() == (stubs.FORMAT, db_version)
+    package_dir = os.path.join(stubs.get_stubs_dir(), stubs.PACKAGE)
+    for path in glob.glob(os.path.join(package_dir, '*.pyi')):
+        with open(path) as f:
+            assert f.readline() == stubs.HEADER
+            assert f.readline() == stubs.VERSION % db_version
@@ -0,0 +1,41 @@
+### pyls_bess --- bess plugin for pyls      -*- coding: utf-8; -*-
+
+## Copyright (C) 2019-2020 Felicián Németh
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pyls_bess.sugar import (IMPORT_LINE, desugar, replace_double_colon,
+                             replace_rarrows, split_statements)
+
+def desugar_whole(src):
+    "Desugar `src` in one piece, without splitting it into statements."
+    src, _ = replace_double_colon(IMPORT_LINE + '\n' + src)
+    return replace_rarrows(src)
+
+def test_continued_string_with_arrow():
+    src = "s = 'a \\\n-> b'\nx -> y\n"
+    assert split_statements(src) == ["s = 'a \\\n-> b'\n", 'x -> y\n']
+    desugared = desugar(src)
+    text, arrows = desugar_whole(src)
+    assert desugared.text == text
+    assert desugared.arrows == arrows
+    assert "-> b'" in desugared.text
+    assert arrows == [(3, 2)]
+
+def test_triple_quote_closes_continued_string():
+    src = "s = 'a\\\nx -> y '''\nq -> r\n"
+    desugared = desugar(src)
+    text, arrows = desugar_whole(src)
+    assert desugared.text == text
+    assert desugared.arrows == arrows